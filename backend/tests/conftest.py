@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+PACKAGE = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the webserver imports wordle_bot as a package, like the Docker image where it is copied next to it
+sys.path.insert(0, PACKAGE)
+
+
+@pytest.fixture(autouse=True)
+def wordle_bot_dir(monkeypatch):
+    """the files are read relative to wordle_bot"""
+    monkeypatch.chdir(os.path.join(PACKAGE, "wordle_bot"))
@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+pytest.importorskip("waitress")
+
+from backend import webserver
+from conftest import PACKAGE
+
+
+@pytest.fixture(scope="module")
+def solver():
+    cwd = os.getcwd()
+    os.chdir(os.path.join(PACKAGE, "wordle_bot"))
+    try:
+        yield webserver.wordle.Solver()
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(solver, monkeypatch):
+    """a test client on a loaded solver and an empty cache, the loader thread is never started"""
+    monkeypatch.setattr(webserver, "solver", solver)
+    monkeypatch.setattr(webserver, "cache", webserver.ResponseCache())
+    return webserver.app.test_client()
+
+
+@pytest.fixture
+def solved(solver, monkeypatch):
+    """records the attempts of every find_words call on the solver"""
+    calls = []
+    find_words = solver.find_words
+
+    def recording(attempts, *args, **kwargs):
+        calls.append(attempts)
+        return find_words(attempts, *args, **kwargs)
+
+    monkeypatch.setattr(solver, "find_words", recording)
+    return calls
+
+
+def test_cache_key_canonical():
+    key = webserver.ResponseCache.key([["hallo", "ffctf"], ["Tisch", "fcfft"]], "entropy")
+    assert webserver.ResponseCache.key([["tisch", "fcfft"], ["hallo", "ffctf"]], "entropy") == key
+    assert webserver.ResponseCache.key([["HALLO", "FFCTF"], ["tisch", "fcfft"]], "entropy") == key
+    assert webserver.ResponseCache.key([["hallo", "ffctf"], ["tisch", "fcfft"], ["Hallo", "ffctf"]], "entropy") == key
+    assert webserver.ResponseCache.key({"tisch": "fcfft", "hallo": "ffctf"}, "entropy") == key
+
+    assert webserver.ResponseCache.key([["hallo", "ffctf"]], "entropy") != key
+    assert webserver.ResponseCache.key([["hallo", "ffctf"], ["tisch", "fcfft"]], "positional") != key
+    assert webserver.ResponseCache.key([["hallo", "ffctf"], ["tisch", "fcfft"]], "entropy", 1) != key
+
+
+def test_equivalent_boards_hit_cache(client, solved):
+    first = client.post("/api/v1", json=[["hallo", "ffctf"], ["Tisch", "fcfft"]])
+    second = client.post("/api/v1", json={"TISCH": "fcfft", "hallo": "FFCTF"})
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json()
+    assert len(solved) == 1
+    assert webserver.cache.statistics()["hits"] == 1
+
+
+def test_batch_keeps_order_and_solves_duplicates_once(client, solved):
+    boards = [[["hallo", "ffctf"]], [["tisch", "fffff"]], {"HALLO": "ffctf"}, [["kranz", "fcfff"]],
+              [["tisch", "fffff"], ["tisch", "fffff"]]]
+    response = client.post("/api/v1/batch", json=boards)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert len(solved) == 3
+    assert len(lines) == len(boards)
+    for board, line in zip(boards, lines):
+        assert line == client.post("/api/v1", json=board).get_json()
+    assert len(solved) == 3
+
+
+def test_batch_jsonl(client, solved):
+    boards = [[["hallo", "ffctf"]], [["tisch", "fffff"]]]
+    response = client.post("/api/v1/batch", data="\n".join(json.dumps(board) for board in boards) + "\n",
+                           content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == \
+           [client.post("/api/v1", json=board).get_json() for board in boards]
+
+
+def test_batch_invalid_board_fails_before_solving(client, solved):
+    response = client.post("/api/v1/batch", json=[[["hallo", "ffctf"]], [["hal", "ffctf"]]])
+    assert response.status_code == 400
+    assert "Invalid board 1" in response.get_data(as_text=True)
+    assert solved == []
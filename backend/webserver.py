@@ -1,29 +1,213 @@
+import json as json_
 import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple, List, Dict
 
 import waitress
 from wordle_bot import wordle
-from flask import Flask, request, make_response
+from flask import Flask, request, make_response, Response
 from flask_cors import CORS
 
 
+TOP_N = 10
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(1024 * 1024)))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+JSONL_MIMETYPES = ["application/x-ndjson", "application/jsonl"]
+
+
+class ResponseCache:
+    """LRU cache of the top matches and probes per canonical board, bounded by entry count and approximate size"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 16 * 1024 * 1024) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.__bytes = 0
+        self.__entries: OrderedDict = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def key(attempts, scoring: str, generation: int = 0) -> Tuple:
+        """attempts in any order, case and with duplicates map to the same key. The generation of the solver is part
+        of the key, so a request still running on a replaced solver can not put its stale matches back after clear"""
+        canonical = {(word.lower(), info.lower()) for word, info in wordle.to_attempt_list(attempts)}
+        return scoring, tuple(sorted(canonical)), generation
+
+    @staticmethod
+    def __size(key: Tuple, result: Dict[str, List[str]]) -> int:
+        return sys.getsizeof(key) + sum(sys.getsizeof(word) + sys.getsizeof(info) for word, info in key[1]) + \
+               sum(sys.getsizeof(word) for words in result.values() for word in words)
+
+    def get(self, key: Tuple) -> Optional[Dict[str, List[str]]]:
+        with self.__lock:
+            result = self.__entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return result
+
+    def put(self, key: Tuple, result: Dict[str, List[str]]):
+        size = self.__size(key, result)
+        with self.__lock:
+            if key in self.__entries:
+                return
+            self.__entries[key] = result
+            self.__bytes += size
+            while len(self.__entries) > self.max_entries or self.__bytes > self.max_bytes:
+                old_key, old_result = self.__entries.popitem(last=False)
+                self.__bytes -= self.__size(old_key, old_result)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def statistics(self) -> dict:
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "bytes": self.__bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
 app = Flask(__name__)
 cors = CORS(app)
+cache = ResponseCache()
+solver: Optional[wordle.Solver] = None
+solver_error: Optional[Exception] = None
+
+
+def load_solver():
+    """loads the solver, then reloads it and invalidates the cache whenever its files change"""
+    global solver, solver_error
+    try:
+        solver = wordle.Solver()
+        print(f"Solver ready with {len(solver.index)} words")
+    except Exception as e:
+        solver_error = e
+        print(f"Could not load solver: {e}")
+        return
+
+    watch_interval = float(os.getenv("WATCH_INTERVAL", "10"))
+    while True:
+        time.sleep(watch_interval)
+        if solver.files_changed():
+            print("Word list or statistics changed, reloading solver...")
+            try:
+                reloaded = wordle.Solver()
+            except Exception as e:
+                # e.g. files replaced while 'wt all' is still running, retried after the next interval
+                solver_error = e
+                print(f"Could not reload solver, keeping the previous one: {e}")
+                continue
+            solver, solver_error = reloaded, None
+            cache.clear()
+
+
+def start_loader() -> threading.Thread:
+    """loads the solver in the background, requests are answered with 503 until it is ready"""
+    thread = threading.Thread(target=load_solver, daemon=True)
+    thread.start()
+    return thread
 
 
 @app.route("/api/v1", methods=['POST', 'GET'])
 def solve():
     if request.method == 'POST':
-        if request.content_length < 110:
-            json = request.get_json(force=True)
-            matches, _ = wordle.find_words(json)
-            return {
-                'matches': matches[:10]
-            }
+        if not solver:
+            return make_response("Solver is not ready yet", 503)
+        if request.content_length and request.content_length >= 110:
+            return make_response("Payload exceeds 110 bytes, use /api/v1/batch for larger boards", 413)
+        json = request.get_json(force=True)
+        scoring = request.args.get("scoring", wordle.DEFAULT_SCORING)
+        if scoring not in solver.scorings:
+            return make_response(f"Unknown scoring, choose one of {list(solver.scorings)}", 400)
+        try:
+            wordle.validate_attempts(json)
+        except ValueError as e:
+            return make_response(f"Invalid board: {e}", 400)
+        return find_cached(solver, json, scoring)
     elif request.method == 'GET':
-        return make_response("UP", 200)
+        if solver and solver_error:
+            return make_response(f"UP, reload failed: {solver_error}", 200)
+        elif solver:
+            return make_response("UP", 200)
+        elif solver_error:
+            return make_response("DOWN", 500)
+        return make_response("STARTING", 503)
+
+
+def find_cached(solver_: wordle.Solver, attempts, scoring: str) -> Dict[str, List[str]]:
+    """top candidates as matches and top probes, words that are no candidates but narrow them down best"""
+    key = cache.key(attempts, scoring, solver_.generation)
+    result = cache.get(key)
+    if result is None:
+        matches, probes, _ = solver_.find_words(attempts, scoring=scoring, limit=TOP_N)
+        result = {'matches': matches, 'probes': probes}
+        cache.put(key, result)
+    return result
+
+
+@app.route("/api/v1/batch", methods=['POST'])
+def solve_batch():
+    """accepts a json array or jsonl lines of boards, streams one jsonl result line per board in the same order.
+    All boards are validated before the first one is solved, a single invalid board fails the whole batch."""
+    solver_ = solver
+    if not solver_:
+        return make_response("Solver is not ready yet", 503)
+    if request.content_length and request.content_length > MAX_BATCH_BYTES:
+        return make_response(f"Payload exceeds {MAX_BATCH_BYTES} bytes", 413)
+    data = request.stream.read(MAX_BATCH_BYTES + 1)
+    if len(data) > MAX_BATCH_BYTES:
+        return make_response(f"Payload exceeds {MAX_BATCH_BYTES} bytes", 413)
+
+    try:
+        if request.mimetype in JSONL_MIMETYPES:
+            boards = [json_.loads(line) for line in data.decode().splitlines() if line.strip()]
+        else:
+            boards = json_.loads(data)
+    except ValueError as e:
+        return make_response(f"Could not parse boards: {e}", 400)
+    if not isinstance(boards, list):
+        return make_response("Expected a list of boards", 400)
+    if len(boards) > MAX_BATCH_SIZE:
+        return make_response(f"Batch exceeds {MAX_BATCH_SIZE} boards", 413)
+
+    scoring = request.args.get("scoring", wordle.DEFAULT_SCORING)
+    if scoring not in solver_.scorings:
+        return make_response(f"Unknown scoring, choose one of {list(solver_.scorings)}", 400)
+    for i, board in enumerate(boards):
+        try:
+            wordle.validate_attempts(board)
+        except ValueError as e:
+            return make_response(f"Invalid board {i}: {e}", 400)
+
+    def results():
+        solved = {}
+        for board in boards:
+            key = cache.key(board, scoring, solver_.generation)
+            if key not in solved:
+                solved[key] = find_cached(solver_, board, scoring)
+            yield json_.dumps(solved[key], ensure_ascii=False) + "\n"
+
+    return Response(results(), mimetype="application/x-ndjson")
+
+
+@app.route("/api/v1/cache", methods=['GET'])
+def cache_statistics():
+    return cache.statistics()
 
 
 if __name__ == '__main__':
+    start_loader()
     port = int(os.getenv("PORT", "8081"))
     print(f"Using Port: {port}")
     waitress.serve(app, port=port, url_scheme='http')
@@ -1,12 +1,15 @@
+import copy
 import datetime
 import json
 import os
 import pickle
 import sys
+import threading
 import time
-from typing import List, Callable, Tuple, Optional
+from typing import List, Callable, Tuple, Optional, Dict, Set
 
 import click
+import numpy
 
 import gui_helper as gui
 import word_list as wt
@@ -17,11 +20,15 @@ class WordleState:
 
     def __init__(self, attempts: List[Tuple[str, str]] = None) -> None:
         self.regex = None
+        self.candidate_count = None
         self.attempts = attempts
 
     def add_regex(self, regex):
         self.regex = regex
 
+    def add_candidate_count(self, count: int):
+        self.candidate_count = count
+
 
 class WordleContainer:
     __translator = {
@@ -31,9 +38,14 @@ class WordleContainer:
         gui.ColorCode.EMPTY: None,
     }
 
-    def __init__(self, word_list: [str], colors: [gui.ColorCode]) -> None:
+    def __init__(self, word_list: [str], colors: [gui.ColorCode], scoring: wordle.Scoring = None) -> None:
+        # guesses are ranked by the scoring of the game, by default by the letter frequencies of the candidates
+        self._scoring: wordle.Scoring = scoring if scoring else wordle.AdaptiveScoring()
+        self._rejected: Set[str] = set()
         self.solution: Optional[str] = None
         self.remaining: Optional[List[str]] = None
+        self.candidates: Optional[List[str]] = None
+        self.narrowed_attempts: int = 0
         self.states: List[WordleState] = []
         self.attempts: List[Tuple[str, str]] = [(word_list[i], self.__to_code_string(colors[i])) for i in
                                                 range(len(word_list))]
@@ -49,19 +61,66 @@ class WordleContainer:
             self.states.append(self.state)
         self.state = WordleState(self.attempts.copy())
 
-    def find(self) -> List[str]:
-        words, regex = wordle.find_words(self.attempts)
-        self.state.add_regex(regex)
-        if not words:
+    @property
+    def scoring(self) -> wordle.Scoring:
+        return self._scoring
+
+    def narrow(self, candidates: Optional[List[str]], attempts: List[Tuple[str, str]], scoring: wordle.Scoring = None,
+               echo: bool = True) -> Tuple[List[str], List[str], Optional[str]]:
+        """candidates of the earlier attempts -> ranking, the candidates also matching attempts and the last query.
+        Like the simulation, without candidates the whole word list is filtered."""
+        words, regex = wordle.narrow_matches(candidates, attempts)
+        return (*wordle.score_words(words, scoring if scoring else self._scoring, echo), regex)
+
+    def find(self, narrowed: Tuple[List[str], List[str], str] = None) -> List[str]:
+        """ranked guesses, best first. These might contain probes, words that are no candidates but narrow them down
+        best. narrowed are the precomputed result of narrow for the attempts since the last call"""
+        if narrowed is not None:
+            ranking, words, regex = narrowed
+        elif self.candidates is None:
+            ranking, words, regex = self.narrow(None, self.attempts)
+        else:
+            # only the attempts since the last call have to be applied to the known candidates
+            ranking, words, regex = self.narrow(self.candidates, self.attempts[self.narrowed_attempts:])
+        ranking = [word for word in ranking if word.lower() not in self._rejected]
+        # the ranked candidates, the probes are no candidates
+        self.__narrowed(wordle.split_probes(ranking, words)[0], regex)
+        if not ranking:
             raise Exception("No Words could be found!")
-        return words
+        return ranking
+
+    def match(self) -> List[str]:
+        """the candidates of all attempts like find, but unscored. For guesses known without a ranking, e.g. from the
+        opening book, so the next find or speculation only has to narrow them"""
+        words, regex = wordle.narrow_matches(None, self.attempts)
+        self.__narrowed([word for word in words if word.lower() not in self._rejected], regex)
+        return self.candidates
+
+    def __narrowed(self, candidates: List[str], regex: Optional[str]):
+        self.candidates = candidates
+        self.narrowed_attempts = len(self.attempts)
+        # there is no state before the first attempt, e.g. when the start word was rejected
+        if self.state:
+            if regex:
+                self.state.add_regex(regex)
+            self.state.add_candidate_count(len(self.candidates))
+
+    def allows(self, word: str) -> bool:
+        """word was not rejected by the game"""
+        return word.lower() not in self._rejected
+
+    def discard(self, word: str):
+        """drops a word the game rejected from the known candidates and all later guesses"""
+        self._rejected.add(word.lower())
+        if self.candidates is not None:
+            self.candidates = [candidate for candidate in self.candidates if candidate.lower() != word.lower()]
 
     def set_solved(self, path: str = None):
         self.__game_solution(path, self.attempts[-1:][0][0], None)
 
     def set_unsolved(self, path: str = None):
-        remaining = self.find()
-        self.__game_solution(path, None, remaining)
+        self.find()
+        self.__game_solution(path, None, self.candidates)
 
     def __game_solution(self, path, solution: str, remaining: [str]):
         self.solution = solution
@@ -81,10 +140,8 @@ class WordleContainer:
                 if not hasattr(instance, "__dict__"):
                     return instance
 
-                new_subdic = vars(instance)
-                for key, value in new_subdic.items():
-                    new_subdic[key] = class2dict(value)
-                return new_subdic
+                # protected attributes like the scoring are no game data
+                return {key: class2dict(value) for key, value in vars(instance).items() if not key.startswith("_")}
 
             class_dict = class2dict(self)
             class_dict['timestamp'] = str(datetime.datetime.now())
@@ -97,17 +154,58 @@ class WordleContainer:
         self.state = None
 
 
+class Speculation:
+    """Next word for every feedback pattern of a submitted guess, precomputed by a background thread while the tiles
+    flip, the most likely patterns first"""
+
+    def __init__(self, container: WordleContainer, guess: str) -> None:
+        self.__table: Dict[str, Tuple[Tuple[List[str], List[str], str], str]] = {}
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, args=(container, guess), daemon=True)
+        self.__thread.start()
+
+    @staticmethod
+    def __quiet(scoring: wordle.Scoring) -> wordle.Scoring:
+        scoring = copy.copy(scoring)
+        scoring.verbose = False
+        return scoring
+
+    def __run(self, container: WordleContainer, guess: str):
+        candidates = list(container.candidates)
+        scoring = self.__quiet(container.scoring)
+        patterns = wordle.compute_patterns(wordle.encode_words([guess]), wordle.encode_words(candidates))[0]
+        counts = numpy.bincount(patterns, minlength=wordle.PATTERN_COUNT)
+        for code in numpy.argsort(-counts, kind="stable")[:numpy.count_nonzero(counts)]:
+            if self.__stopped.is_set():
+                return
+            info = wordle.decode_pattern(code)
+            narrowed = container.narrow(candidates, [(guess, info)], scoring, echo=False)
+            if narrowed[0]:
+                self.__table[info] = (narrowed, narrowed[0][0])
+
+    def stop(self):
+        self.__stopped.set()
+        self.__thread.join()
+
+    def lookup(self, info: str) -> Optional[Tuple[Tuple[List[str], List[str], str], str]]:
+        """stops the precomputation -> narrowed candidates and next word if info was computed in time"""
+        self.stop()
+        return self.__table.get(info)
+
+
 class GameMaster:
 
     def __init__(self, scoring_algorithm: wordle.Scoring,
                  start_word_manager: wt.StartWordManager,
                  interface: gui.Interface,
                  base_path: str,
-                 games_to_play: int = 1) -> None:
+                 games_to_play: int = 1,
+                 opening_book: wordle.OpeningBook = None) -> None:
         self._wordle_container: WordleContainer = None
         self._session_path: str = None
         self._current_solution_word: str = None
         self._scoring_algorithm: wordle.Scoring = scoring_algorithm
+        self._opening_book: wordle.OpeningBook = opening_book if opening_book else wordle.OpeningBook()
         self._start_word_manager: wt.StartWordManager = start_word_manager
         self._interface: gui.Interface = interface
         self._base_path: str = base_path
@@ -140,11 +238,11 @@ class GameMaster:
                     print("Input to few words, again...")
                 else:
                     break
-            self._wordle_container = WordleContainer(words, colors)
+            self._wordle_container = WordleContainer(words, colors, self._scoring_algorithm)
             self._start_word_manager.start_word = words[0]
             self._current_solution_word = self._wordle_container.find()[0]
         else:
-            self._wordle_container: WordleContainer = WordleContainer([], [])
+            self._wordle_container: WordleContainer = WordleContainer([], [], self._scoring_algorithm)
             self._current_solution_word = self._start_word_manager.start_word
         self._interface.move_to("h", .2)
 
@@ -155,43 +253,72 @@ class GameMaster:
 
         while not self._wordle_container.is_solved() and self._attempts < 6:
             self._interface.put_solution(self._current_solution_word)
-            self.wait(1, "animation to start")
+            speculation = self.speculate()
 
-            retries = 20 if self._attempts >= 5 else 10
-            waiting_duration = .5 if self._attempts >= 5 else .2
-            for try_ in range(retries):
-                try:
+            try:
+                # returns as soon as the flip animation of the current row settled
+                current_colors = self._interface.get_colors(self._attempts)
+                if self._interface.input_mode != gui.InputMode.MOUSE and \
+                        not all_current_row(lambda code: code != gui.ColorCode.EMPTY):
+                    # an empty row might also be a lost key or click, verify with the slow mouse input
+                    print(f"Row stayed empty, entering {self._current_solution_word} again with the mouse...")
+                    self._interface.erase()
+                    self._interface.put_solution(self._current_solution_word, gui.InputMode.MOUSE)
                     current_colors = self._interface.get_colors(self._attempts)
-                    break
-                except gui.ColorStateException as e:
-                    self.wait(waiting_duration, "valid game state")
-                    if try_ == retries - 1:
-                        print("Could not get valid game state, exiting...")
-                        raise e
+            except gui.ColorStateException as e:
+                print("Could not get valid game state, exiting...")
+                raise e
 
             if not all_current_row(lambda code: code != gui.ColorCode.EMPTY):
                 print(f"Word {self._current_solution_word} seems not to be wordle word, removing...")
-                wt.remove_word(self._current_solution_word)
+                if speculation:
+                    speculation.stop()
+                # hidden from the cached index and the known candidates right away, so it is never typed again
+                wt.remove_word(self._current_solution_word, background=True)
+                self._wordle_container.discard(self._current_solution_word)
                 print("Delete word...")
-                [self._interface.click_on("delete", duration=0, echo=False) for _ in range(5)]
+                self._interface.erase()
+                self._current_solution_word = self._wordle_container.find()[0]
                 if self._attempts == 0:
-                    print(f"Start Word is not legit, careful, this can lead to endless loop!")
-                    self._current_solution_word = self._start_word_manager.start_word
-                else:
-                    self._current_solution_word = self._wordle_container.find()[0]
+                    print(f"Start word is not legit, starting with {self._current_solution_word} instead")
+                    self._start_word_manager.start_word = self._current_solution_word
                 continue
 
             self._wordle_container.update(self._current_solution_word, current_colors[self._attempts])
 
             if all_current_row(lambda code: code == gui.ColorCode.OK):
+                if speculation:
+                    speculation.stop()
                 self._wordle_container.set_solved(self._session_path)
             else:
                 print(f"Word '{self._current_solution_word}' was not solution, "
                       f"starting iteration {self._attempts + 1}/6...")
-                words = self._wordle_container.find()
-                self._current_solution_word = self._scoring_algorithm.evaluate(words)[0]
+                self._current_solution_word = self.next_word(speculation)
             self._attempts += 1
 
+    def speculate(self) -> Optional[Speculation]:
+        """starts precomputing the next word for the submitted one, once the candidates are known"""
+        if self._wordle_container.candidates is None:
+            return None
+        return Speculation(self._wordle_container, self._current_solution_word)
+
+    def next_word(self, speculation: Speculation = None) -> str:
+        guess = self._opening_book.guess(self._scoring_algorithm, self._wordle_container.attempts)
+        if guess and self._wordle_container.allows(guess):
+            if speculation:
+                speculation.stop()
+            # unscored, the speculation on the book guess narrows them
+            candidates = self._wordle_container.match()
+            print(f"Found second word in opening book, {len(candidates)} candidates remain")
+            return guess
+        precomputed = speculation.lookup(self._wordle_container.attempts[-1][1]) if speculation else None
+        if precomputed:
+            narrowed, word = precomputed
+            print(f"Found precomputed next word, {len(narrowed[1])} candidates remain")
+            self._wordle_container.find(narrowed)
+            return word
+        return self._wordle_container.find()[0]
+
     def end_game(self):
         self._interface.wait_for_endscreen()
         self._interface.make_endscreen_screenshot(self._session_path)
@@ -200,13 +327,7 @@ class GameMaster:
             print(f"Solution was '{self._current_solution_word}', solved in {self._attempts} attempts")
             self._won += 1
             new_path += self._current_solution_word
-            with open("../files/whitelist.txt", mode="r+") as file:
-                word_set = set(file.read().split())
-                l_b = len(word_set)
-                word_set.add(self._current_solution_word)
-                l_a = len(word_set)
-                if l_b < l_a:
-                    file.write(self._current_solution_word + "\n")
+            self._start_word_manager.store.add_whitelist_word(self._current_solution_word)
         else:
             print("Could not solve wordle puzzle")
             self._lost += 1
@@ -232,7 +353,8 @@ class GameMaster:
         Games Won: {self._won}
         Games Lost: {self._lost}
         All Attempts: {self._all_attempts}
-        Average Attempts per game: {self._all_attempts / self.games_played()}""")
+        Average Attempts per game: {self._all_attempts / self.games_played() if self.games_played() else None}""")
+        self._start_word_manager.end_session()
         self._interface.click_on("home_button")
 
     def prepare_session(self):
@@ -334,6 +456,18 @@ def read(path, psm):
     click.echo(text)
 
 
+@cli.command("capture-rate")
+@click.option("-f", "--frames", default=50)
+@click.pass_context
+def capture_rate(ctx, frames):
+    """measures how fast a row of the board can be watched"""
+    interface_: gui.Interface = ctx.obj['interface']
+    seconds = gui.capture_rate(lambda: interface_.capture_board(slice(0, 1)), frames)
+    frame = max(seconds, gui.FRAME_INTERVAL)
+    print(f"{1000 * seconds:.1f} ms per grab, {1 / frame:.1f} frames/s, "
+          f"a settled row is detected {1000 * gui.STABLE_FRAMES * frame:.0f} ms after the last change at the earliest")
+
+
 @cli.command()
 def scr_read():
     gui.scr_read()
@@ -446,6 +580,19 @@ def new_interface(ctx):
             bottom, right = gui.mouse_position()
             interface.endscreen_window = (left, top, bottom - top, right - left)
 
+        if 'interface' not in ctx.obj or update("input mode"):
+            modes = [mode.name for mode in gui.InputMode]
+            interface.input_mode = gui.InputMode[click.prompt("Input mode", type=click.Choice(modes),
+                                                              default=interface.input_mode.name)]
+            interface.key_interval = click.prompt("Seconds between keys", type=float, default=interface.key_interval)
+            if interface.input_mode == gui.InputMode.KEYBOARD:
+                for c in "äöüß":
+                    key = input(f"Key to press for {c} (leave empty to click it): ")
+                    if key:
+                        interface.key_map[c] = key
+                    else:
+                        interface.key_map.pop(c, None)
+
     except Exception as e:
         print(f"{e}")
 
@@ -457,26 +604,33 @@ def new_interface(ctx):
 
 @cli.command("play")
 @click.option("-w", "--start_word")
+@click.option("-r", "--ranked", is_flag=True, default=False,
+              help="pick start words weighted from the top of 'wt rank-start-words' instead of start_words.json")
 @click.option("-c", "--count", default=1, type=click.IntRange(1, sys.maxsize))
+@click.option("-s", "--scoring", type=click.Choice(list(wordle.scorings)), default=wordle.DEFAULT_SCORING)
 @click.pass_context
-def start(ctx, start_word, count):
+def start(ctx, start_word, ranked, count, scoring):
     interface: gui.Interface = ctx.obj["interface"]
     base_path = "/home/florian/Pictures/wordles/" + str(datetime.datetime.now()).replace(" ", "_")
 
     if start_word:
         start_word_manager = wt.StartWordManager(start_word)
     else:
-        start_word_manager = wt.StartWordManager()
+        start_word_manager = wt.StartWordManager(use_ranking=ranked)
 
-    scoring_algorithm: wordle.Scoring = wordle.SimpleScoring()
+    scoring_algorithm: wordle.Scoring = wordle.scorings[scoring]()
 
-    game_master = GameMaster(scoring_algorithm, start_word_manager, interface, base_path, count)
+    game_master = GameMaster(scoring_algorithm, start_word_manager, interface, base_path, count,
+                             wordle.OpeningBook.load())
     game_master.prepare_session()
-    while game_master.keep_playing():
-        game_master.prepare_game()
-        game_master.play_game()
-        game_master.end_game()
-    game_master.end_session()
+    try:
+        while game_master.keep_playing():
+            game_master.prepare_game()
+            game_master.play_game()
+            game_master.end_game()
+    finally:
+        # statistics of the finished games are kept even if a game fails or the session is interrupted
+        game_master.end_session()
 
 
 if __name__ == '__main__':
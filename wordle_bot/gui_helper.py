@@ -1,18 +1,30 @@
 import datetime
 import os
 import subprocess
-import tempfile
 import time
 from abc import ABC
 from enum import Enum, unique, auto
-from typing import Dict, Tuple
+from typing import Callable, Dict, Optional, Tuple
 
 import numpy as numpy
 import pyautogui as gui
-from PIL import Image, ImageOps, ImageChops
+from PIL import Image, ImageOps, ImageChops, ImageGrab
 from pytesseract import image_to_string
 
 
+# max difference per rgb channel of a pixel to a color of the palette
+TOLERANCE = 5
+# cells are sampled as the mean of the (2 * PATCH_RADIUS + 1)² pixels around the color position
+PATCH_RADIUS = 1
+# the screen is watched frame by frame, it settled once STABLE_FRAMES consecutive frames are identical. Frames start
+# at most every FRAME_INTERVAL seconds, slower if grabbing takes longer, 'bot capture-rate' measures the real rate
+FRAME_INTERVAL = .03
+STABLE_FRAMES = 3
+ROW_TIMEOUT = 10
+# a row still empty after this many seconds was not accepted by the game
+REJECT_DELAY = 1
+
+
 class ColorStateException(Exception):
 
     def __init__(self, *args: object) -> None:
@@ -98,6 +110,16 @@ class ColorCode(Enum):
     EMPTY = auto()
 
 
+@unique
+class InputMode(Enum):
+    # mouse travel to every key of the on screen keyboard
+    MOUSE = auto()
+    # zero duration clicks on the on screen keys
+    CLICK = auto()
+    # key events, letters without a valid key are clicked
+    KEYBOARD = auto()
+
+
 class Interface(ABC):
 
     @property
@@ -156,7 +178,37 @@ class Interface(ABC):
     def next_word_rgb(self, value):
         self._next_word_rgb = value
 
+    @property
+    def input_mode(self) -> InputMode:
+        return self._input_mode
+
+    @input_mode.setter
+    def input_mode(self, value: InputMode):
+        self._input_mode = value
+
+    @property
+    def key_map(self) -> Dict[str, str]:
+        """letter -> key name sent in keyboard mode, e.g. for ä/ö/ü/ß on the layout of the game"""
+        return self._key_map
+
+    @key_map.setter
+    def key_map(self, value):
+        self._key_map = value
+
+    @property
+    def key_interval(self) -> float:
+        """seconds between two keys in click and keyboard mode"""
+        return self._key_interval
+
+    @key_interval.setter
+    def key_interval(self, value):
+        self._key_interval = value
+
     def __init__(self) -> None:
+        self._input_mode: InputMode = InputMode.MOUSE
+        self._key_map: Dict[str, str] = {}
+        self._key_interval: float = .05
+        self.__focused: bool = False
         self._identifier: str = ""
         self._commands: [str] = ""
         self._color_positions: [[Tuple[int, int]]] = None
@@ -205,13 +257,22 @@ class Interface(ABC):
         self._next_word_rgb: RGB = None
         self._endscreen_window = (-1, -1, -1, -1)
 
+    def __getstate__(self):
+        # the window has to be focused again in every session
+        state = self.__dict__.copy()
+        state.pop("_Interface__focused", None)
+        return state
+
+    def __setstate__(self, state):
+        # interfaces pickled before a setting existed get its default
+        self.__init__()
+        self.__dict__.update(state)
+
     def wait_for_endscreen(self):
         x, y = self.elements["next_word"]
-        rgb_next = self.get_pixel_color_by_position((x, y))
         print("Waiting for endscreen...")
-        while not self.next_word_rgb.compare_with_range(rgb_next):
-            time.sleep(.2)
-            rgb_next = self.get_pixel_color_by_position((x, y))
+        watch(lambda: grab((x, y, 1, 1))[0, 0],
+              lambda pixel, _: self.next_word_rgb.compare_with_range(RGB(tuple(pixel.tolist()))))
 
     def make_endscreen_screenshot(self, _session_path):
         screenshot(self.endscreen_window, False, _session_path, "endscreen.png")
@@ -227,66 +288,117 @@ class Interface(ABC):
         gui.moveTo(x, y, duration=duration)
         gui.leftClick(x, y)
 
-    def type(self, word: str, duration: float = .5, echo: bool = True):
+    def __key(self, c: str) -> Optional[str]:
+        key = self.key_map.get(c, c)
+        return key if key and gui.isValidKey(key) else None
+
+    def __click(self, element: str):
+        x, y = self.elements[element]
+        gui.click(x, y, _pause=False)
+        time.sleep(self.key_interval)
+
+    def focus(self):
+        """clicks the first tile, key events only reach the game once its window has the focus"""
+        x, y = self.color_positions[0][0]
+        gui.click(x, y, _pause=False)
+        time.sleep(self.key_interval)
+        self.__focused = True
+
+    def __press(self, key: str, presses: int = 1):
+        if not self.__focused:
+            self.focus()
+        gui.press(key, presses=presses, interval=self.key_interval, _pause=False)
+        time.sleep(self.key_interval)
+
+    def type(self, word: str, duration: float = .5, echo: bool = True, mode: InputMode = None):
+        mode = mode if mode else self.input_mode
         if echo:
             print(f"Type word {word}...")
         for c in word:
-            self.click_on(c, duration, False)
+            if mode == InputMode.MOUSE:
+                self.click_on(c, duration, False)
+            elif mode == InputMode.KEYBOARD and self.__key(c):
+                self.__press(self.__key(c))
+            else:
+                self.__click(c)
 
-    def put_solution(self, next_word):
+    def put_solution(self, next_word, mode: InputMode = None):
+        mode = mode if mode else self.input_mode
         w = next_word.lower()
         print(f"Put word: {next_word}")
-        self.type(w[:1], echo=False)
-        self.type(w[1:], duration=.1, echo=False)
-        self.click_on("submit")
+        if mode == InputMode.MOUSE:
+            self.type(w[:1], echo=False, mode=mode)
+            self.type(w[1:], duration=.1, echo=False, mode=mode)
+            self.click_on("submit")
+        else:
+            self.type(w, echo=False, mode=mode)
+            if mode == InputMode.KEYBOARD:
+                self.__press("enter")
+            else:
+                self.__click("submit")
+
+    def erase(self, count: int = 5):
+        if self.input_mode == InputMode.KEYBOARD:
+            self.__press("backspace", count)
+        else:
+            [self.click_on("delete", duration=0, echo=False) for _ in range(count)]
 
     def move_to(self, element: str, duration: float = .5):
         x, y = self.elements[element]
         gui.moveTo(x, y, duration=duration)
 
-    def __get_pixel_matrix(self):
-        left, top = self.color_positions[0][0]
-        right, bottom = self.color_positions[len(self.color_positions) - 1][len(self.color_positions[0]) - 1]
-        width = right - left
-        height = bottom - top
-        scr, path = screenshot((left, top, width + 1, height + 1))
-        px = Image.open(path).load()
-        os.remove(path)
-
-        matrix = []
-        for row_ in range(6):
-            row = []
-            for col_ in range(5):
-                x, y = self.color_positions[row_][col_]
-                x -= left
-                y -= top
-                pixel = px[x, y]
-                row.append(RGB(pixel))
-            matrix.append(row)
-        return matrix
+    def capture_board(self, rows: slice = slice(None), radius: int = PATCH_RADIUS) -> numpy.ndarray:
+        """(rows, 5, 3) mean rgb color of the patch around every color position, sampled from a single in memory
+        screenshot of the rows, averaging makes the colors robust against anti-aliasing"""
+        positions = numpy.array(self.color_positions, dtype=numpy.int64)[rows]
+        left, top = positions.min(axis=(0, 1)) - radius
+        right, bottom = positions.max(axis=(0, 1)) + radius
+        board = grab((int(left), int(top), int(right - left + 1), int(bottom - top + 1)))
+        offsets = numpy.arange(-radius, radius + 1)
+        ys = positions[..., 1, None, None] - top + offsets[:, None]
+        xs = positions[..., 0, None, None] - left + offsets[None, :]
+        return board[ys, xs].mean(axis=(2, 3))
+
+    def classify(self, pixels: numpy.ndarray) -> numpy.ndarray:
+        """(..., 3) rgb pixels -> ColorCode per pixel, every pixel has to be within TOLERANCE of exactly one color
+        of the palette, for a board of cells the location of the first invalid cell is reported"""
+        codes = list(self._color_codes)
+        palette = numpy.array([self._color_codes[code].rgb for code in codes], dtype=numpy.float64)
+        distances = numpy.abs(numpy.asarray(pixels, dtype=numpy.float64)[..., None, :] - palette).max(axis=-1)
+        matches = distances <= TOLERANCE
+        counts = matches.sum(axis=-1)
+
+        invalid = numpy.argwhere(counts != 1)
+        if len(invalid):
+            cell = tuple(invalid[0])
+            rgb = RGB(tuple(int(round(channel)) for channel in pixels[cell]))
+            location = f" at location ({cell[1]}|{cell[0]})" if len(cell) == 2 else ""
+            if counts[cell] > 1:
+                names = [codes[i].name for i in numpy.flatnonzero(matches[cell])]
+                raise MultipleColorMatches(f"{rgb} matched multiple colors {names}{location}")
+            raise ColorStateException(f"Could not recognize color: {rgb}{location}")
+        return numpy.array(codes, dtype=object)[matches.argmax(axis=-1)]
+
+    def wait_for_row(self, row: int, timeout: float = ROW_TIMEOUT) -> numpy.ndarray:
+        """watches only the given row until its flip animation settled, either every cell has a color or it stayed
+        empty for REJECT_DELAY seconds, -> ColorCode per cell"""
+
+        def is_final(frame: numpy.ndarray, elapsed: float) -> bool:
+            try:
+                empty = self.classify(frame) == ColorCode.EMPTY
+            except (ColorStateException, MultipleColorMatches):
+                return False
+            return not empty.any() or (empty.all() and elapsed >= REJECT_DELAY)
+
+        return self.classify(watch(lambda: self.capture_board(slice(row, row + 1))[0], is_final, timeout=timeout))
 
     def get_colors(self, attempt_row: int, check_if_some_empty_in_current_row: bool = True) -> [[ColorCode]]:
-        color_matrix: [[ColorCode]] = []
-        for _ in range(6):
-            color_matrix.append([ColorCode.EMPTY] * 5)
-
-        while True:
-            matrix: [[Tuple[int, int]]] = self.__get_pixel_matrix()
-            for row in range(attempt_row + 1):
-                for col in range(5):
-                    rgb: RGB = matrix[row][col]
-                    try:
-                        color: ColorCode = self.__get_rgb_code(rgb)
-                    except ColorStateException as e:
-                        raise ColorStateException(str(e) + f" at location ({col}|{row})")
-                    color_matrix[row][col] = color
-            if not check_if_some_empty_in_current_row:
-                break
-            elif color_matrix[attempt_row][0] != ColorCode.EMPTY and \
-                    any([code == ColorCode.EMPTY for code in color_matrix[attempt_row]]):
-                continue
-            else:
-                break
+        if check_if_some_empty_in_current_row:
+            self.wait_for_row(attempt_row)
+        # rows after the attempt row are not classified, they are expected to be empty
+        colors = self.classify(self.capture_board(slice(attempt_row + 1)))
+        color_matrix: [[ColorCode]] = [list(row) for row in colors]
+        color_matrix += [[ColorCode.EMPTY] * 5 for _ in range(5 - attempt_row)]
         return color_matrix
 
     @staticmethod
@@ -310,30 +422,51 @@ class Interface(ABC):
     @staticmethod
     def get_pixel_color_by_position(pos: Tuple[int, int]) -> RGB:
         x, y = pos
-        path = tempfile.gettempdir() + f"/tmp_{int(round(datetime.datetime.now().timestamp()))}.png"
-        gui.screenshot(path, region=(x - 1, y - 1, 3, 3))
-        px = Image.open(path).load()
-        pixel = px[1, 1]
-        os.remove(path)
-        return RGB(pixel)
+        return RGB(tuple(grab((x, y, 1, 1))[0, 0].tolist()))
 
     def get_color_code_by_position(self, pos: Tuple[int, int]) -> ColorCode:
         pixel_rgb: RGB = self.get_pixel_color_by_position(pos)
-        return self.__get_rgb_code(pixel_rgb)
-
-    def __get_rgb_code(self, rgb: RGB) -> ColorCode:
-        color_codes = [color_code for color_code, rgb_ in self._color_codes.items() if rgb.compare_with_range(rgb_)]
-        if len(color_codes) == 1:
-            return color_codes[0]
-        elif len(color_codes) > 1:
-            raise MultipleColorMatches(f"{rgb} matched multiple colors {[code.name for code in color_codes]}")
-        else:
-            raise ColorStateException(f"Could not recognize color: {rgb})")
+        return self.classify(numpy.array(pixel_rgb.rgb))
 
     def __str__(self) -> str:
         return self.identifier
 
 
+def watch(capture: Callable[[], numpy.ndarray], is_final: Callable[[numpy.ndarray, float], bool],
+          stable_frames: int = STABLE_FRAMES, interval: float = FRAME_INTERVAL,
+          timeout: Optional[float] = None) -> numpy.ndarray:
+    """captures frames until stable_frames consecutive ones are identical and the last one is final for the seconds
+    elapsed, raises ColorStateException after timeout seconds"""
+    start = time.perf_counter()
+    previous, identical = None, 0
+    while True:
+        frame_start = time.perf_counter()
+        frame = capture()
+        elapsed = time.perf_counter() - start
+        identical = identical + 1 if previous is not None and numpy.array_equal(frame, previous) else 1
+        if identical >= stable_frames and is_final(frame, elapsed):
+            return frame
+        if timeout is not None and elapsed > timeout:
+            raise ColorStateException(f"Screen did not settle within {timeout} seconds")
+        previous = frame
+        time.sleep(max(0., interval - (time.perf_counter() - frame_start)))
+
+
+def grab(region: Tuple[int, int, int, int]) -> numpy.ndarray:
+    """(left, top, width, height) -> (height, width, 3) rgb pixels. Read straight from the display server (XCB on
+    linux, GDI on windows), unlike pyautogui.screenshot, which runs scrot and writes a png file on linux"""
+    left, top, width, height = region
+    return numpy.asarray(ImageGrab.grab(bbox=(left, top, left + width, top + height)).convert("RGB"))
+
+
+def capture_rate(capture: Callable[[], numpy.ndarray], frames: int = 50) -> float:
+    """seconds per frame of capture, averaged over frames"""
+    start = time.perf_counter()
+    for _ in range(frames):
+        capture()
+    return (time.perf_counter() - start) / frames
+
+
 def mouse_position():
     return gui.position()
 
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+WORDLE_BOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the modules import each other flat, like the CLIs started from wordle_bot
+sys.path.insert(0, WORDLE_BOT)
+
+
+@pytest.fixture(autouse=True)
+def wordle_bot_dir(monkeypatch):
+    """the files are read relative to wordle_bot"""
+    monkeypatch.chdir(WORDLE_BOT)
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+from collections import Counter
+
+import numpy
+import pytest
+
+import word_list as wt
+import wordle
+from conftest import WORDLE_BOT
+
+
+@pytest.fixture
+def scratch_files(tmp_path, monkeypatch):
+    """copy of the files with the first 300 words and their pattern matrix, read relative to a scratch wordle_bot"""
+    files = tmp_path / "files"
+    shutil.copytree(os.path.join(WORDLE_BOT, "..", "files"), files,
+                    ignore=shutil.ignore_patterns("*.npy", "*.bundle", "*.db*", "opening_book.json"))
+    words = wordle.load_words()[:300]
+    (files / "5long.txt").write_text("".join(word + "\n" for word in words))
+    (tmp_path / "wordle_bot").mkdir()
+    monkeypatch.chdir(tmp_path / "wordle_bot")
+    wordle.create_pattern_matrix()
+    return words
+
+
+def test_statistics_store_flush(tmp_path):
+    path = str(tmp_path / "statistics.db")
+    store = wt.StatisticsStore(path)
+    word = store.start_words()[0]["word"]
+    before = store.start_word(word)
+
+    store.record_game(word, True, 3)
+    store.record_game(word, False, 6)
+    store.record_game("zzzzz", True, 4)
+    # games are buffered until flush
+    assert store.start_word(word) == before
+    store.flush()
+    store.flush()
+
+    after = store.start_word(word)
+    assert (after["won"], after["lost"], after["all_attempts"]) == \
+           (before["won"] + 1, before["lost"] + 1, before["all_attempts"] + 9)
+    assert store.start_word("zzzzz") == {"word": "zzzzz", "won": 1, "lost": 0, "avg_attempts": 4., "all_attempts": 4}
+
+    # a second session on the same database increments instead of overwriting
+    other = wt.StatisticsStore(path)
+    other.record_game(word, True, 2)
+    other.flush()
+    assert store.start_word(word)["won"] == before["won"] + 2
+
+
+def test_persist_removal_matches_recompute(scratch_files):
+    word = scratch_files[42]
+    with open(wordle.STATISTICS_PATH) as file:
+        statistics = json.load(file)
+
+    wt.persist_removal(word)
+
+    words = wordle.load_words()
+    assert words == scratch_files[:42] + scratch_files[43:]
+    assert word in wordle.load_words("../files/blacklist.txt")
+    with open(wordle.STATISTICS_PATH) as file:
+        patched = json.load(file)
+    # counted like create_statistics, distinct characters before lower casing
+    removed = Counter(c.lower() for c in set(word))
+    assert patched == {c: count - removed[c] for c, count in statistics.items()}
+    assert wordle.WordIndex.patterns_current()
+    codes = wordle.encode_words(words)
+    assert numpy.array_equal(numpy.load(wordle.PATTERN_MATRIX_PATH), wordle.compute_patterns(codes, codes))
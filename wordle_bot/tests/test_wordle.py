@@ -0,0 +1,127 @@
+import hashlib
+import random
+
+import numpy
+import pytest
+
+import wordle
+
+SECTIONS = ["packed", "case", "statistics", "ranks", "whitelist", "scores"]
+
+
+def distinct_letter_words(count: int, seed: int):
+    """sample of the word list without repeated letters, the regex engine does not handle those"""
+    words = [word for word in wordle.load_words() if len(set(word.lower())) == wordle.WORD_LENGTH]
+    return random.Random(seed).sample(words, count)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_engines_agree_with_regex_engine(seed):
+    answer, *guesses = distinct_letter_words(4, seed)
+    attempts = [(guess, wordle.feedback(guess, answer)) for guess in guesses[:seed % 3 + 1]]
+    expected, _ = wordle.RegexEngine().filter(attempts)
+    expected = sorted(word.lower() for word in expected)
+
+    assert answer.lower() in expected
+    for engine in [wordle.PatternEngine(), wordle.BitmaskEngine()]:
+        words, _ = engine.filter(attempts)
+        assert sorted(word.lower() for word in words) == expected, engine.name
+
+
+def repeated_letter_words(count: int, seed: int):
+    words = [word for word in wordle.load_words() if len(set(word.lower())) < wordle.WORD_LENGTH]
+    return random.Random(seed).sample(words, count)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_engines_agree_with_feedback(seed):
+    """boards with repeated letters in the answer, the guesses or both, checked against every word's feedback"""
+    rng = random.Random(seed)
+    words = wordle.load_words()
+    answer = repeated_letter_words(1, seed)[0] if seed % 2 else rng.choice(words)
+    guesses = repeated_letter_words(seed % 3 + 1, seed + 100)
+    guesses[0] = rng.choice(words) if seed % 3 == 0 else guesses[0]
+    attempts = [(guess, wordle.feedback(guess, answer)) for guess in guesses]
+
+    codes = wordle.encode_words(words)
+    patterns = wordle.compute_patterns(wordle.encode_words(guesses), codes)
+    infos = [[wordle.encode_info(info)] for _, info in attempts]
+    expected = sorted(words[i].lower() for i in (patterns == infos).all(axis=0).nonzero()[0])
+
+    assert answer.lower() in expected
+    for engine in [wordle.PatternEngine(), wordle.BitmaskEngine()]:
+        found, _ = engine.filter(attempts)
+        assert sorted(word.lower() for word in found) == expected, engine.name
+
+
+@pytest.mark.parametrize("guess, answer, info", [
+    ("speed", "abide", "ffcfc"),
+    ("eerie", "there", "cfcft"),
+    ("llama", "hello", "ccfff"),
+    ("hello", "llama", "ffccf"),
+    ("geese", "geese", "ttttt"),
+])
+def test_feedback_repeated_letters(guess, answer, info):
+    assert wordle.feedback(guess, answer) == info
+
+
+def test_bundle_round_trip(tmp_path):
+    path = str(tmp_path / "words.bundle")
+    wordle.WordBundle.create(path, with_patterns=False)
+    bundle = wordle.WordBundle(path)
+
+    assert bundle.words == wordle.load_words()
+    assert bundle.patterns is None
+    digest = hashlib.sha256()
+    for name in SECTIONS:
+        digest.update(bundle.section(name).tobytes())
+    assert bundle.content_hash == digest.hexdigest()
+
+    wordle.WordBundle.create(path + "2", with_patterns=False)
+    assert wordle.WordBundle(path + "2").content_hash == bundle.content_hash
+
+
+def test_adaptive_scoring_counts_match_recount():
+    scoring = wordle.AdaptiveScoring()
+    scoring.verbose = False
+    candidates = wordle.load_words()
+    rng = random.Random(0)
+    # shrinking candidates are derived incrementally, a larger or unrelated list is recounted
+    for size in [2000, 1500, 1400, 300, 40, 39, 1]:
+        candidates = rng.sample(candidates, size)
+        codes = wordle.encode_words(candidates)
+        frequencies, expected = scoring._frequencies(candidates, codes), wordle.letter_frequencies(codes)
+        assert len(frequencies) == len(expected)
+        for counts, expected_counts in zip(frequencies, expected):
+            assert numpy.array_equal(counts, expected_counts)
+
+        recount = wordle.AdaptiveScoring()
+        recount.verbose = False
+        assert scoring.evaluate(list(candidates)) == recount.evaluate(list(candidates))
+
+
+def test_positional_scores_repeated_letters():
+    codes = wordle.encode_words(["hallo", "hello", "Tisch"])
+    positional, presence, duplicates = wordle.letter_frequencies(codes)
+    assert duplicates.tolist() == [2 if letter == "l" else 0 for letter in wordle.ALPHABET]
+
+    # positional + presence + words repeating a letter, the h of Tisch is at another position
+    scores = wordle.PositionalScoring.scores(codes, positional, presence, duplicates)
+    assert scores.tolist() == [9 + 8 + 2, 9 + 8 + 2, 5 + 7]
+
+
+def test_simulation_with_opening_book(tmp_path):
+    scoring = wordle.PositionalScoring()
+    scoring.verbose = False
+    book = wordle.OpeningBook.create(["tisch"], [scoring], path=str(tmp_path / "opening_book.json"))
+    answers = random.Random(0).sample(wordle.load_words(), 50)
+
+    # the book guess is the best scored word of the same candidates, the games are the same
+    with_book, without_book = wordle.SimulationResult(), wordle.SimulationResult()
+    for answer in answers:
+        wordle.simulate_game(answer, "tisch", "pattern", scoring, with_book, book)
+        wordle.simulate_game(answer, "tisch", "pattern", scoring, without_book)
+    assert with_book.distribution == without_book.distribution
+    assert with_book.lost == without_book.lost
+    assert with_book.timings["book"] > 0
+    assert without_book.timings["book"] == 0
@@ -1,8 +1,17 @@
 import itertools
 import json
+import os
 import random
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import click
+import numpy
+
+import wordle
 
 
 @click.group()
@@ -15,73 +24,153 @@ def statistic():
     pass
 
 
-class StartWordManager:
-
-    def update_statistics(self, won: bool, attempts: int):
+class StatisticsStore:
+    """Start word statistics and whitelist in sqlite, replacing the rewrite of the json / text files after every game.
+    Games and whitelist words are buffered and written in one transaction by flush, the counters are incremented
+    in the database, so concurrent sessions do not overwrite each other. export regenerates the files.
+    The database is the single source of truth: start_words.json and whitelist.txt are imported once, when the
+    database is created, and overwritten by every export afterwards, so edits of the files are lost. Change the
+    statistics with the commands instead, or delete statistics.db to import the edited files again."""
+
+    def __init__(self, path: str = "../files/statistics.db") -> None:
+        new_database = not os.path.exists(path)
+        self.__connection = sqlite3.connect(path, timeout=30)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        with self.__connection:
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS start_words ("
+                                      "word TEXT PRIMARY KEY, won INTEGER, lost INTEGER, all_attempts INTEGER)")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS whitelist (word TEXT PRIMARY KEY)")
+        self.__games: List[Tuple[str, bool, int]] = []
+        self.__whitelist: List[str] = []
+        if new_database:
+            self.__import_files()
+
+    def __import_files(self):
         with open("../files/start_words.json", mode="r") as file:
-            json_file = json.load(file)
-        word_list = [w for w in json_file if w['word'] == self.__start_word]
+            start_words = json.load(file)
+        with open("../files/whitelist.txt", mode="r") as file:
+            whitelist = file.read().split()
+        with self.__connection:
+            self.__connection.executemany("INSERT OR IGNORE INTO start_words VALUES (?, ?, ?, ?)",
+                                          [(w['word'], w['won'], w['lost'], w['all_attempts']) for w in start_words])
+            self.__connection.executemany("INSERT OR IGNORE INTO whitelist VALUES (?)", [(w,) for w in whitelist])
 
-        if not word_list:
-            self.add_start_word_statistics(self.__start_word, 1 if won else 0, 1 if not won else 0, attempts)
-        else:
-            word = word_list[0]
-            if won:
-                word['won'] += 1
-            else:
-                word['lost'] += 1
+    @staticmethod
+    def __to_dict(word: str, won: int, lost: int, all_attempts: int) -> dict:
+        return {
+            "word": word,
+            "won": won,
+            "lost": lost,
+            "avg_attempts": all_attempts / (won + lost) if won + lost else None,
+            "all_attempts": all_attempts
+        }
+
+    def start_words(self) -> List[dict]:
+        rows = self.__connection.execute("SELECT word, won, lost, all_attempts FROM start_words ORDER BY rowid")
+        return [self.__to_dict(*row) for row in rows]
+
+    def start_word(self, word: str) -> Optional[dict]:
+        row = self.__connection.execute("SELECT word, won, lost, all_attempts FROM start_words WHERE word = ?",
+                                        (word,)).fetchone()
+        return self.__to_dict(*row) if row else None
+
+    def add_start_word(self, word: str, won: int = 0, lost: int = 0, all_attempts: int = 0) -> bool:
+        with self.__connection:
+            cursor = self.__connection.execute("INSERT OR IGNORE INTO start_words VALUES (?, ?, ?, ?)",
+                                               (word, won, lost, all_attempts))
+        return cursor.rowcount == 1
+
+    def record_game(self, word: str, won: bool, attempts: int):
+        self.__games.append((word, won, attempts))
+
+    def add_whitelist_word(self, word: str):
+        self.__whitelist.append(word)
+
+    def flush(self):
+        """writes all buffered games and whitelist words in one transaction"""
+        with self.__connection:
+            self.__connection.executemany("INSERT OR IGNORE INTO start_words VALUES (?, 0, 0, 0)",
+                                          [(word,) for word, _, _ in self.__games])
+            self.__connection.executemany("UPDATE start_words SET won = won + ?, lost = lost + ?, "
+                                          "all_attempts = all_attempts + ? WHERE word = ?",
+                                          [(1 if won else 0, 0 if won else 1, attempts, word)
+                                           for word, won, attempts in self.__games])
+            self.__connection.executemany("INSERT OR IGNORE INTO whitelist VALUES (?)",
+                                          [(word,) for word in self.__whitelist])
+        self.__games.clear()
+        self.__whitelist.clear()
+
+    def export(self):
+        """regenerates start_words.json and whitelist.txt from the database, overwriting any edits of the files"""
+        self.__replace("../files/start_words.json", json.dumps(self.start_words(), indent=2))
+        rows = self.__connection.execute("SELECT word FROM whitelist ORDER BY rowid")
+        self.__replace("../files/whitelist.txt", "".join(word + "\n" for word, in rows))
+
+    @staticmethod
+    def __replace(path: str, content: str) -> bool:
+        """writes content only if it differs, the mtimes of the files mark the word bundle and the opening book as
+        outdated"""
+        if os.path.exists(path):
+            with open(path, mode="r") as file:
+                if file.read() == content:
+                    return False
+        with open(path + ".tmp", mode="w") as file:
+            file.write(content)
+        os.replace(path + ".tmp", path)
+        return True
 
-            word['all_attempts'] += attempts
-            word['avg_attempts'] = word['all_attempts'] / (word['won'] + word['lost'])
 
-        with open("../files/start_words.json", mode="w") as file:
-            json.dump(json_file, file, indent=2)
+class StartWordManager:
+    RANKING_TOP = 20
+
+    @property
+    def store(self) -> StatisticsStore:
+        if self.__store is None:
+            self.__store = StatisticsStore()
+        return self.__store
+
+    def update_statistics(self, won: bool, attempts: int):
+        self.store.record_game(self.__start_word, won, attempts)
         self.__statistics_updated = True
 
     @property
     def start_word(self):
         if not self.__statistics_updated:
             raise Exception("Update statistics before getting another start_word")
-        if self.__generate_word:
-            with open("../files/start_words.json", mode="r") as file:
-                json_file = json.load(file)
-            length = len(json_file)
-            randint = random.randint(0, length - 1)
-            self.__start_word = json_file[randint]['word']
+        if self.__generate_word and self.__use_ranking:
+            with open("../files/start_word_ranking.json", mode="r") as file:
+                ranking = json.load(file)[:self.RANKING_TOP]
+            self.__start_word = random.choices([w['word'].lower() for w in ranking], [w['entropy'] for w in ranking])[0]
+        elif self.__generate_word:
+            start_words = self.store.start_words()
+            self.__start_word = start_words[random.randint(0, len(start_words) - 1)]['word']
         return self.__start_word
 
     @start_word.setter
     def start_word(self, value):
         self.__start_word = value
 
-    def __init__(self, start_word: str = None) -> None:
+    def __init__(self, start_word: str = None, use_ranking: bool = False, store: StatisticsStore = None) -> None:
         self.__generate_word = start_word is None
+        self.__use_ranking = use_ranking
         self.__start_word = start_word
         self.__statistics_updated = True
+        self.__store: Optional[StatisticsStore] = store
+
+    def end_session(self):
+        """writes the statistics of all games of the session and regenerates the json files"""
+        self.store.flush()
+        self.store.export()
 
     @staticmethod
     def add_start_word_statistics(word: str, won: int = 0, lost: int = 0, all_attempts: int = 0,
-                                  avg_attempts: int = None):
-        with open("../files/start_words.json", mode="r") as file:
-            load = json.load(file)
-
-        j_obj = [w for w in load if w['word'] == word]
-        if j_obj:
+                                  store: StatisticsStore = None):
+        store = store if store else StatisticsStore()
+        if not store.add_start_word(word, won, lost, all_attempts):
             print(f"Word '{word}' already in wordlist:")
-            print(json.dumps(j_obj[0], indent=2))
+            print(json.dumps(store.start_word(word), indent=2))
             return
-
-        load.append(
-            {
-                "word": word,
-                "won": won,
-                "lost": lost,
-                "all_attempts": all_attempts,
-                "avg_attempts": avg_attempts
-            }
-        )
-        with open("../files/start_words.json", mode="w") as file:
-            json.dump(load, file, indent=2)
+        store.export()
 
 
 @cli1.command()
@@ -92,19 +181,64 @@ def add_start_word(word):
 
 @cli1.command("remove")
 @click.argument("word")
-@click.pass_context
-def remove(ctx, word):
+def remove(word):
     remove_word(word)
-    ctx.invoke(create_wordlist_command)
-    ctx.invoke(create_statistics)
 
 
-def remove_word(word):
-    with open("../files/blacklist.txt", mode="a") as blacklist:
-        blacklist.writelines(word + "\n")
+_removal_lock = threading.Lock()
+
+
+def remove_word(word: str, background: bool = False) -> Optional[threading.Thread]:
+    """removes a word the game rejected, right away from the results of the loaded index and from the files as a
+    delta. In the background the files are patched by a worker thread, removals are applied one after another."""
+    wordle.discard_word(word)
+    if not background:
+        persist_removal(word)
+        return None
+    thread = threading.Thread(target=persist_removal, args=(word,), name=f"remove-{word}")
+    thread.start()
+    return thread
+
+
+def persist_removal(word: str):
+    """patches word list, statistics, base scores and pattern matrix instead of recreating them"""
+    with _removal_lock:
+        start = time.perf_counter()
+        words = wordle.load_words(wordle.WORD_LIST_PATH)
+        position = next((i for i, word_ in enumerate(words) if word_.lower() == word.lower()), None)
+        spelling = words[position] if position is not None else word
+        with open("../files/blacklist.txt", mode="a") as blacklist:
+            blacklist.writelines(spelling + "\n")
+        if position is None:
+            click.echo(f"Word '{word}' is not in the word list, only blacklisted it")
+            return
 
-    create_wordlist()
-    create_statistics()
+        patterns_current = wordle.WordIndex.patterns_current()
+        del words[position]
+        with open(wordle.WORD_LIST_PATH + ".tmp", mode="w") as file:
+            file.writelines(word_ + "\n" for word_ in words)
+        os.replace(wordle.WORD_LIST_PATH + ".tmp", wordle.WORD_LIST_PATH)
+
+        with open(wordle.STATISTICS_PATH) as file:
+            statistics = json.load(file)
+        for c in set(spelling):
+            statistics[c.lower()] -= 1
+        write_statistics(statistics)
+
+        if patterns_current:
+            patterns = numpy.load(wordle.PATTERN_MATRIX_PATH, mmap_mode="r")
+            if patterns.shape == (len(words) + 1, len(words) + 1):
+                patterns = numpy.delete(numpy.delete(patterns, position, axis=0), position, axis=1)
+                with open(wordle.PATTERN_MATRIX_PATH + ".tmp", mode="wb") as file:
+                    numpy.save(file, patterns)
+                del patterns
+                try:
+                    os.replace(wordle.PATTERN_MATRIX_PATH + ".tmp", wordle.PATTERN_MATRIX_PATH)
+                except OSError:
+                    # the matrix might still be mapped by this process, it is recomputed on demand
+                    os.remove(wordle.PATTERN_MATRIX_PATH + ".tmp")
+                    click.echo("Could not replace the pattern matrix, run 'wt create-patterns'")
+        click.echo(f"Removed '{spelling}' in {(time.perf_counter() - start) * 1000:.0f}ms")
 
 
 @statistic.command()
@@ -112,6 +246,12 @@ def create_statistic():
     create_statistics()
 
 
+@statistic.command("export-statistics")
+def export_statistics():
+    StatisticsStore().export()
+    click.echo("Done exporting start_words.json and whitelist.txt!")
+
+
 @statistic.command()
 def print_statistics():
     import json
@@ -132,9 +272,15 @@ def create_statistics():
                     statistics[c] = statistics[c] + 1
                 else:
                     statistics[c] = 1
-    import json
-    with open("../files/statistics.json", mode="w") as file:
+    write_statistics(statistics)
+
+
+def write_statistics(statistics: Dict[str, int]):
+    """replaces the letter statistics and the base scores derived from them"""
+    with open(wordle.STATISTICS_PATH + ".tmp", mode="w") as file:
         file.write(json.dumps(statistics, indent=4, sort_keys=True))
+    os.replace(wordle.STATISTICS_PATH + ".tmp", wordle.STATISTICS_PATH)
+    wordle.create_base_scores(statistics)
 
 
 @cli1.command("create-wordlist")
@@ -142,25 +288,142 @@ def create_wordlist_command():
     create_wordlist()
 
 
+ALPHABET = frozenset(wordle.ALPHABET)
+
+
+def read_dictionary(path: str, encoding: str) -> Iterator[str]:
+    """streams the stripped, unicode normalized lines of a word list"""
+    with open(path, mode="r", encoding=encoding) as file:
+        for line in file:
+            word = unicodedata.normalize("NFC", line.strip())
+            if word:
+                yield word
+
+
+def is_wordle_word(word: str) -> bool:
+    """five letters of the wordle alphabet, regardless of case"""
+    return len(word) == 5 and set(word.lower()) <= ALPHABET
+
+
 def create_wordlist():
+    """streams the dictionary once, keeps the five letter words which are not blacklisted and replaces the word list
+    atomically, blacklisted spellings are matched exactly"""
+    start = time.perf_counter()
+    blacklist = set(read_dictionary("../files/blacklist.txt", "utf-8"))
+    click.echo(f"Loaded {len(blacklist)} blacklisted words in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    read = blacklisted = duplicates = 0
+    seen = set()
     words = []
-    with open("german.dic", mode='r', encoding="ISO-8859-1") as file:
-        for line in file.readlines():
-            if len(line) == 6:
-                words.append(line)
-    with open("../files/blacklist.txt", mode="r") as file:
-        for line in file.readlines():
-            words.remove(line)
-    with open("../files/5long.txt", mode='w') as file:
-        file.writelines(words)
+    for word in read_dictionary("german.dic", "ISO-8859-1"):
+        read += 1
+        if not is_wordle_word(word):
+            continue
+        if word in blacklist:
+            blacklisted += 1
+        elif word in seen:
+            duplicates += 1
+        else:
+            seen.add(word)
+            words.append(word)
+    click.echo(f"Read {read} words, kept {len(words)} of {len(words) + blacklisted + duplicates} five letter words "
+               f"({blacklisted} blacklisted, {duplicates} duplicates) in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    with open("../files/5long.txt.tmp", mode="w", encoding="utf-8") as file:
+        file.writelines(word + "\n" for word in words)
+    os.replace("../files/5long.txt.tmp", "../files/5long.txt")
+    click.echo(f"Wrote {len(words)} words in {time.perf_counter() - start:.2f}s")
     click.echo("Done recreating wordlists!")
 
 
+@cli1.command("create-patterns")
+def create_patterns_command():
+    create_patterns()
+
+
+def create_patterns():
+    wordle.create_pattern_matrix()
+    click.echo("Done recreating pattern matrix!")
+
+
+@cli1.command("create-bundle")
+@click.option("--without-patterns", is_flag=True, default=False)
+def create_bundle_command(without_patterns):
+    create_bundle(not without_patterns)
+
+
+def create_bundle(with_patterns: bool = True):
+    wordle.WordBundle.create(with_patterns=with_patterns)
+    click.echo("Done recreating word bundle!")
+
+
+@cli1.command("build-opening-book")
+@click.option("-s", "--scoring", "scoring_names", type=click.Choice(list(wordle.scorings)), multiple=True,
+              help="defaults to all scorings")
+def build_opening_book(scoring_names):
+    scoring_names = scoring_names if scoring_names else list(wordle.scorings)
+    book = wordle.OpeningBook.create(scorings_=[wordle.scorings[name]() for name in scoring_names])
+    click.echo(f"Done building opening book, {len(book)} start words over all scorings!")
+
+
+@cli1.command("rank-start-words")
+@click.option("-p", "--workers", type=click.IntRange(1), default=1, help="number of worker processes")
+@click.option("-t", "--top", default=20, help="number of best start words to print")
+def rank_start_words(workers, top):
+    ranking = wordle.rank_openers(workers)
+    with open("../files/start_word_ranking.json", mode="w") as file:
+        json.dump(ranking, file, indent=2, ensure_ascii=False)
+    for i, entry in enumerate(ranking[:top]):
+        click.echo(f"{i + 1}. {entry['word']}: entropy {entry['entropy']:.3f}, "
+                   f"expected remaining {entry['expected_remaining']:.1f}, worst case {entry['worst_case']}")
+
+
+@cli1.command("evaluate-start-words")
+@click.option("-a", "--answers", type=click.Choice(["wordlist", "whitelist"]), default="wordlist")
+@click.option("-e", "--engine", type=click.Choice(list(wordle.engines)), default=wordle.DEFAULT_ENGINE)
+@click.option("-s", "--scoring", type=click.Choice(list(wordle.scorings)), default=wordle.DEFAULT_SCORING)
+@click.option("-p", "--workers", type=click.IntRange(1), default=1, help="number of worker processes")
+@click.option("--checkpoint", default="../files/start_words_checkpoint.json", type=click.Path())
+def evaluate_start_words(answers, engine, scoring, workers, checkpoint):
+    with open("../files/start_words.json", mode="r") as file:
+        start_words = [w['word'] for w in json.load(file)]
+    answer_words = wordle.load_words(wordle.WORD_LIST_PATH if answers == "wordlist" else wordle.WHITELIST_PATH)
+    if not answer_words:
+        click.echo(f"No answers in the {answers}, nothing to evaluate")
+        return
+
+    results = wordle.evaluate_start_words(start_words, answer_words, engine, scoring, workers, checkpoint)
+    statistics = [
+        {
+            "word": word,
+            "won": result.won,
+            "lost": len(result.lost),
+            "all_attempts": result.all_attempts,
+            "avg_attempts": result.all_attempts / result.games,
+            "simulated": True,
+            "scoring": scoring,
+            "answers": answers
+        }
+        for word, result in results.items()
+    ]
+    with open("../files/start_words_simulated.json", mode="w") as file:
+        json.dump(statistics, file, indent=2)
+    # no checkpoint is written if there were no shards to play
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    for w in sorted(statistics, key=lambda x: x['avg_attempts']):
+        click.echo(f"{w['word']}: won {w['won']}, lost {w['lost']}, average attempts {w['avg_attempts']:.3f}")
+
+
 @cli1.command("all")
 @click.pass_context
 def all(ctx):
     ctx.invoke(create_wordlist_command)
     ctx.invoke(create_statistics)
+    ctx.invoke(create_patterns_command)
+    ctx.invoke(create_bundle_command)
 
 
 cli = click.CommandCollection(sources=[cli1, statistic])
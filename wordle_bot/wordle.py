@@ -1,11 +1,21 @@
+import concurrent.futures
+import hashlib
 import itertools
+import json
+import mmap
+import multiprocessing
+import os
 import re
+import struct
+import threading
+import time
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from enum import Enum
-from typing import Set, List, Dict, Optional
+from typing import Set, List, Dict, Optional, Tuple, Callable
 
 import click
+import numpy
 
 
 class ImmutableElementException(Exception):
@@ -25,6 +35,199 @@ InfoCoding.dict = {
     InfoCoding.CONTAINED.value: InfoCoding.CONTAINED
 }
 
+InfoCoding.digit = {
+    InfoCoding.NOT_CONTAINED: 0,
+    InfoCoding.CONTAINED: 1,
+    InfoCoding.CORRECT: 2
+}
+
+WORD_LENGTH = 5
+PATTERN_COUNT = 3 ** WORD_LENGTH
+ALPHABET = "abcdefghijklmnopqrstuvwxyzäöüß"
+WORD_LIST_PATH = "../files/5long.txt"
+PATTERN_MATRIX_PATH = "../files/patterns.npy"
+STATISTICS_PATH = "../files/statistics.json"
+WHITELIST_PATH = "../files/whitelist.txt"
+SCORES_PATH = "../files/scores.json"
+BUNDLE_PATH = "../files/words.bundle"
+START_WORDS_PATH = "../files/start_words.json"
+OPENING_BOOK_PATH = "../files/opening_book.json"
+
+LETTER_BITS = 5
+NO_LETTER = 255
+
+_letter_codes: Dict[str, int] = {char: i for i, char in enumerate(ALPHABET)}
+# unicode code point -> letter code, all letters of the alphabet are below 256
+_letter_lookup: numpy.ndarray = numpy.full(256, NO_LETTER, dtype=numpy.uint8)
+_letter_lookup[[ord(char) for char in ALPHABET]] = numpy.arange(len(ALPHABET))
+_code_points: numpy.ndarray = numpy.array([ord(char) for char in ALPHABET], dtype=numpy.uint32)
+_digit_codes: Dict[int, str] = {digit: info.value for info, digit in InfoCoding.digit.items()}
+
+
+def encode_info(info: str) -> int:
+    """t/f/c word information -> pattern code, one base 3 digit per position"""
+    return sum(InfoCoding.digit[InfoCoding.dict[char]] * 3 ** i for i, char in enumerate(info.lower()))
+
+
+def decode_pattern(code: int) -> str:
+    info = ""
+    for _ in range(WORD_LENGTH):
+        code, digit = divmod(int(code), 3)
+        info += _digit_codes[digit]
+    return info
+
+
+def load_words(path: str = WORD_LIST_PATH) -> List[str]:
+    with open(path) as file:
+        return file.read().split()
+
+
+def encode_words(words: [str]) -> numpy.ndarray:
+    """words -> contiguous (len(words), 5) uint8 matrix of letter codes, one row per word"""
+    lowered = [word.lower() for word in words]
+    invalid = [word for word in lowered if len(word) != WORD_LENGTH]
+    if invalid:
+        raise ValueError(f"Words have to be {WORD_LENGTH} letters long: {invalid[:5]}")
+    points = numpy.array(lowered, dtype=f"<U{WORD_LENGTH}").view(numpy.uint32).reshape(-1, WORD_LENGTH)
+    codes = _letter_lookup[numpy.minimum(points, len(_letter_lookup) - 1)]
+    unknown = (codes == NO_LETTER) | (points >= len(_letter_lookup))
+    if unknown.any():
+        raise KeyError("".join(sorted({chr(point) for point in points[unknown]})))
+    return codes
+
+
+def decode_words(codes: numpy.ndarray) -> List[str]:
+    """(n, 5) letter codes -> lower case words"""
+    return _code_points[codes].view(f"<U{WORD_LENGTH}").ravel().tolist()
+
+
+def pack_words(codes: numpy.ndarray) -> numpy.ndarray:
+    """(n, 5) letter codes -> one uint32 per word, 5 bits per letter with the first letter in the lowest bits"""
+    shifts = LETTER_BITS * numpy.arange(WORD_LENGTH, dtype=numpy.uint32)
+    return numpy.bitwise_or.reduce(codes.astype(numpy.uint32) << shifts, axis=1)
+
+
+def unpack_words(packed: numpy.ndarray) -> numpy.ndarray:
+    """uint32 per word -> (n, 5) letter codes"""
+    shifts = LETTER_BITS * numpy.arange(WORD_LENGTH, dtype=numpy.uint32)
+    return ((packed[:, None] >> shifts) & (2 ** LETTER_BITS - 1)).astype(numpy.uint8)
+
+
+def count_letters(codes: numpy.ndarray) -> numpy.ndarray:
+    """(n, 5) letter codes -> (n, len(ALPHABET)) occurrences of every letter per word"""
+    return (codes[:, :, None] == numpy.arange(len(ALPHABET), dtype=numpy.uint8)).sum(axis=1, dtype=numpy.uint8)
+
+
+def letter_frequencies(codes: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """(n, 5) letter codes -> (5, len(ALPHABET)) words with the letter at each position, words containing the letter
+    and words containing it more than once"""
+    offsets = len(ALPHABET) * numpy.arange(WORD_LENGTH, dtype=numpy.int64)
+    positional = numpy.bincount((codes + offsets).ravel(), minlength=WORD_LENGTH * len(ALPHABET))
+    counts = count_letters(codes)
+    return positional.reshape(WORD_LENGTH, len(ALPHABET)), (counts > 0).sum(axis=0), (counts > 1).sum(axis=0)
+
+
+def compute_patterns(guesses: numpy.ndarray, answers: numpy.ndarray, chunk_size: int = 256) -> numpy.ndarray:
+    """encoded guesses x encoded answers -> matrix of pattern codes the game would show for each pair"""
+    weights = 3 ** numpy.arange(WORD_LENGTH)
+    patterns = numpy.empty((len(guesses), len(answers)), dtype=numpy.uint8)
+    answers_ = answers[None, :, :]
+    for start in range(0, len(guesses), chunk_size):
+        guesses_ = guesses[start:start + chunk_size, None, :]
+        correct = guesses_ == answers_
+        contained = numpy.zeros_like(correct)
+        for i in range(WORD_LENGTH):
+            letter = guesses_[:, :, i:i + 1]
+            # occurrences in the answer not already used up by a correct position or an earlier contained one
+            available = ((answers_ == letter) & ~correct).sum(axis=2)
+            used = ((guesses_[:, :, :i] == letter) & contained[:, :, :i]).sum(axis=2)
+            contained[:, :, i] = ~correct[:, :, i] & (available > used)
+        patterns[start:start + chunk_size] = (correct * 2 + contained) @ weights
+    return patterns
+
+
+def pattern_counts(patterns: numpy.ndarray) -> numpy.ndarray:
+    """guesses x candidates pattern matrix -> (guesses, PATTERN_COUNT) number of candidates per pattern"""
+    patterns = numpy.asarray(patterns)
+    offsets = patterns + (numpy.arange(len(patterns)) * PATTERN_COUNT)[:, None]
+    counts = numpy.bincount(offsets.ravel(), minlength=len(patterns) * PATTERN_COUNT)
+    return counts.reshape(len(patterns), PATTERN_COUNT)
+
+
+def count_patterns(patterns: numpy.ndarray, rows: numpy.ndarray = None, columns: numpy.ndarray = None,
+                   chunk_size: int = 128) -> numpy.ndarray:
+    """pattern_counts of the rows x columns sub matrix, gathered in chunks of rows small enough to stay in cache"""
+    rows = numpy.arange(len(patterns)) if rows is None else numpy.asarray(rows)
+    counts = numpy.zeros((len(rows), PATTERN_COUNT), dtype=numpy.int64)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        block = patterns[chunk[0]:chunk[-1] + 1] if chunk[-1] - chunk[0] + 1 == len(chunk) else patterns[chunk]
+        block = numpy.asarray(block) if columns is None else numpy.take(block, columns, axis=1)
+        counts[start:start + chunk_size] = pattern_counts(block)
+    return counts
+
+
+def counts_entropies(counts: numpy.ndarray) -> numpy.ndarray:
+    """candidates per pattern of every guess -> expected information gain in bits of every guess"""
+    candidates = counts.sum(axis=1)
+    # c * log2(c) looked up for every count instead of computing a logarithm per cell
+    values = numpy.arange(counts.max(initial=0) + 1)
+    weights = values * numpy.log2(values, out=numpy.zeros(len(values)), where=values > 0)
+    weighted = weights[counts].sum(axis=1)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        entropies = numpy.log2(candidates) - weighted / candidates
+    return numpy.where(candidates > 0, entropies, 0.)
+
+
+def pattern_entropies(patterns: numpy.ndarray, chunk_size: int = 128) -> numpy.ndarray:
+    """guesses x candidates pattern matrix -> expected information gain in bits of every guess"""
+    if not patterns.shape[1]:
+        return numpy.zeros(len(patterns))
+    return counts_entropies(count_patterns(patterns, chunk_size=chunk_size))
+
+
+def create_pattern_matrix(word_path: str = WORD_LIST_PATH, pattern_path: str = PATTERN_MATRIX_PATH):
+    codes = encode_words(load_words(word_path))
+    numpy.save(pattern_path, compute_patterns(codes, codes))
+
+
+def file_mtimes(paths: [str]) -> Tuple[float, ...]:
+    """modification time of every path, 0 for missing files"""
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else 0 for path in paths)
+
+
+def split_probes(ranking: List[str], candidates: List[str]) -> Tuple[List[str], List[str]]:
+    """ranking -> the ranked candidates and the ranked probes, words of the ranking that are no candidates"""
+    candidates_ = {word.lower() for word in candidates}
+    matches = [word for word in ranking if word.lower() in candidates_]
+    return matches, [word for word in ranking if word.lower() not in candidates_]
+
+
+def validate_attempts(attempts) -> List[Tuple[str, str]]:
+    """to_attempt_list of untrusted input, raises a ValueError naming the first invalid word or info"""
+    try:
+        attempt_list = to_attempt_list(attempts)
+    except (TypeError, ValueError):
+        raise ValueError("Attempts have to be a list of [word, info] pairs or a {word: info} dict")
+    for word, info in attempt_list:
+        if not isinstance(word, str) or len(word) != WORD_LENGTH or \
+                any(char not in _letter_codes for char in word.lower()):
+            raise ValueError(f"Word {word!r} has to be {WORD_LENGTH} letters of '{ALPHABET}'")
+        if not isinstance(info, str) or len(info) != WORD_LENGTH or \
+                any(char not in InfoCoding.dict for char in info.lower()):
+            raise ValueError(f"Info {info!r} of {word!r} has to be {WORD_LENGTH} letters of "
+                             f"'{''.join(InfoCoding.dict)}'")
+    return attempt_list
+
+
+def to_attempt_list(attempts) -> List[Tuple[str, str]]:
+    if isinstance(attempts, list):
+        return [(word, info) for word, info in attempts]
+    elif isinstance(attempts, dict):
+        return list(attempts.items())
+    else:
+        raise ValueError("either dict or list")
+
 
 class Char(ABC):
 
@@ -256,13 +459,7 @@ class ColorInfoWordleRegex(WordleRegexBuilder):
 
     def __init__(self, attempts) -> None:
         super().__init__()
-        self.__attempts: [Word]
-        if isinstance(attempts, list):
-            self.__attempts: [Word] = [Word(word, info) for word, info in [attempt for attempt in attempts]]
-        elif isinstance(attempts, dict):
-            self.__attempts: [Word] = [Word(key, value) for key, value in attempts.items()]
-        else:
-            raise ValueError("either dict or list")
+        self.__attempts: [Word] = [Word(word, info) for word, info in to_attempt_list(attempts)]
 
     def __generate_element_list(self):
         return [multiplier.to_regex_string() for multiplier in self.lookaheads.values()] + ["^"] + [
@@ -280,54 +477,909 @@ class ColorInfoWordleRegex(WordleRegexBuilder):
         return regex_string
 
 
+class WordIndex:
+    """Word list together with the encoded words and the guess x answer pattern matrix"""
+
+    @property
+    def words(self) -> List[str]:
+        return self.__words
+
+    @property
+    def codes(self) -> numpy.ndarray:
+        return self.__codes
+
+    @property
+    def patterns(self) -> numpy.ndarray:
+        if self.__patterns is None:
+            print("Computing pattern matrix in memory, run 'wt create-patterns' to precompute it...")
+            self.__patterns = compute_patterns(self.codes, self.codes)
+        return self.__patterns
+
+    @property
+    def pattern_counts(self) -> numpy.ndarray:
+        """(words, PATTERN_COUNT) number of words per pattern of every word as guess against all words"""
+        if self.__pattern_counts is None:
+            self.__pattern_counts = count_patterns(self.patterns)
+        return self.__pattern_counts
+
+    @property
+    def packed(self) -> numpy.ndarray:
+        """one uint32 per word, see pack_words"""
+        if self.__packed is None:
+            self.__packed = pack_words(self.codes)
+        return self.__packed
+
+    @property
+    def letter_counts(self) -> numpy.ndarray:
+        """(words, letters) occurrences of every letter per word"""
+        if self.__letter_counts is None:
+            self.__letter_counts = count_letters(self.codes)
+        return self.__letter_counts
+
+    @property
+    def all_mask(self) -> int:
+        return (1 << len(self)) - 1
+
+    @property
+    def position_masks(self) -> Dict[Tuple[str, int], int]:
+        """(letter, position) -> bitset of the ids of all words with letter at position"""
+        if self.__position_masks is None:
+            self.__position_masks = {
+                (char, position): self.to_mask(self.letters_at(position) == code)
+                for code, char in enumerate(ALPHABET) for position in range(WORD_LENGTH)
+            }
+        return self.__position_masks
+
+    @property
+    def count_masks(self) -> Dict[Tuple[str, int], int]:
+        """(letter, count) -> bitset of the ids of all words containing letter at least count times"""
+        if self.__count_masks is None:
+            self.__count_masks = {}
+            for code, char in enumerate(ALPHABET):
+                counts = self.letter_counts[:, code]
+                for count in range(1, WORD_LENGTH + 1):
+                    self.__count_masks[(char, count)] = self.to_mask(counts >= count)
+        return self.__count_masks
+
+    def __init__(self, words: List[str], patterns: numpy.ndarray = None) -> None:
+        self.__words: List[str] = words
+        self.__codes: numpy.ndarray = encode_words(words)
+        self.__positions: Dict[str, int] = {word.lower(): i for i, word in enumerate(words)}
+        self.__patterns: Optional[numpy.ndarray] = patterns
+        self.__pattern_counts: Optional[numpy.ndarray] = None
+        self.__packed: Optional[numpy.ndarray] = None
+        self.__letter_counts: Optional[numpy.ndarray] = None
+        self.__position_masks: Optional[Dict[Tuple[str, int], int]] = None
+        self.__count_masks: Optional[Dict[Tuple[str, int], int]] = None
+
+    def __len__(self):
+        return len(self.__words)
+
+    @staticmethod
+    def to_mask(selection: numpy.ndarray) -> int:
+        """boolean selection over all word ids -> bitset with bit i set for every selected id i"""
+        return int.from_bytes(numpy.packbits(selection, bitorder="little").tobytes(), "little")
+
+    def from_mask(self, mask: int) -> numpy.ndarray:
+        """bitset -> sorted array of the selected word ids"""
+        bits = numpy.frombuffer(mask.to_bytes((len(self) + 7) // 8, "little"), dtype=numpy.uint8)
+        return numpy.unpackbits(bits, bitorder="little")[:len(self)].nonzero()[0]
+
+    def precompute(self):
+        """creates all lazily computed tables right away"""
+        _ = self.patterns, self.pattern_counts, self.packed, self.letter_counts, self.position_masks, self.count_masks
+
+    @staticmethod
+    def __remove_bit(mask: int, position: int) -> int:
+        """bitset without bit position, all higher bits move down by one"""
+        return (mask & ((1 << position) - 1)) | ((mask >> (position + 1)) << position)
+
+    def without(self, word: str) -> 'WordIndex':
+        """copy of the index without word, the tables computed so far are patched instead of recomputed"""
+        position = self.position(word)
+        if position is None:
+            return self
+        index = WordIndex.__new__(WordIndex)
+        index.__words = self.__words[:position] + self.__words[position + 1:]
+        index.__codes = numpy.delete(self.__codes, position, axis=0)
+        index.__positions = {word_.lower(): i for i, word_ in enumerate(index.__words)}
+        index.__patterns = None
+        if self.__patterns is not None:
+            index.__patterns = numpy.delete(numpy.delete(self.__patterns, position, axis=0), position, axis=1)
+        index.__pattern_counts = None
+        if self.__pattern_counts is not None:
+            column = numpy.asarray(self.__patterns[:, position])
+            pattern_counts_ = self.__pattern_counts.copy()
+            pattern_counts_[numpy.arange(len(self)), column] -= 1
+            index.__pattern_counts = numpy.delete(pattern_counts_, position, axis=0)
+        index.__packed = None if self.__packed is None else numpy.delete(self.__packed, position)
+        index.__letter_counts = None
+        if self.__letter_counts is not None:
+            index.__letter_counts = numpy.delete(self.__letter_counts, position, axis=0)
+        index.__position_masks = None
+        if self.__position_masks is not None:
+            index.__position_masks = {key: self.__remove_bit(mask, position)
+                                      for key, mask in self.__position_masks.items()}
+        index.__count_masks = None
+        if self.__count_masks is not None:
+            index.__count_masks = {key: self.__remove_bit(mask, position) for key, mask in self.__count_masks.items()}
+        return index
+
+    def letters_at(self, position: int) -> numpy.ndarray:
+        """letter code at position of every word, a view into codes"""
+        return self.codes[:, position]
+
+    def position(self, word: str) -> Optional[int]:
+        return self.__positions.get(word.lower())
+
+    def pattern_row(self, word: str) -> numpy.ndarray:
+        """pattern codes of guess 'word' against every word of the index"""
+        position = self.position(word)
+        if position is not None:
+            return self.patterns[position]
+        return compute_patterns(encode_words([word]), self.codes)[0]
+
+    @staticmethod
+    def patterns_current(word_path: str = WORD_LIST_PATH, pattern_path: str = PATTERN_MATRIX_PATH) -> bool:
+        return os.path.exists(pattern_path) and os.path.getmtime(pattern_path) >= os.path.getmtime(word_path)
+
+    @classmethod
+    def load(cls, word_path: str = WORD_LIST_PATH, pattern_path: str = PATTERN_MATRIX_PATH,
+             use_mmap: bool = True) -> 'WordIndex':
+        words = load_words(word_path)
+
+        patterns = None
+        if cls.patterns_current(word_path, pattern_path):
+            patterns = numpy.load(pattern_path, mmap_mode="r" if use_mmap else None)
+            if patterns.shape != (len(words), len(words)):
+                print(f"Pattern matrix {pattern_path} does not match {word_path}, ignoring it...")
+                patterns = None
+        return cls(words, patterns)
+
+
+_word_index: Optional[WordIndex] = None
+
+
+def get_index() -> WordIndex:
+    global _word_index
+    if _word_index is None:
+        _word_index = WordBundle().index() if WordBundle.is_current() else WordIndex.load()
+    return _word_index
+
+
+_discarded: Set[str] = set()
+_discard_lock = threading.Lock()
+
+
+def discard_word(word: str) -> threading.Thread:
+    """hides word from find_words / narrow_words right away. The loaded index is rebuilt without it by a worker
+    thread and swapped in atomically, so running filters keep a consistent one and callers never wait for it."""
+    _discarded.add(word.lower())
+    thread = threading.Thread(target=__rebuild_index, args=(word,), name=f"discard-{word}", daemon=True)
+    thread.start()
+    return thread
+
+
+def __rebuild_index(word: str):
+    global _word_index
+    # rebuilds are applied one after another, each on top of the latest index
+    with _discard_lock:
+        if _word_index is not None:
+            _word_index = _word_index.without(word)
+
+
+def is_discarded(word: str) -> bool:
+    return word.lower() in _discarded
+
+
+def _visible(words: List[str]) -> List[str]:
+    """words without the discarded ones"""
+    if not _discarded:
+        return words
+    return [word for word in words if word.lower() not in _discarded]
+
+
+class ColorInfoWordleBitmask(WordleRegexBuilder):
+    """Same constraints as ColorInfoWordleRegex, evaluated as AND / AND-NOT over the bitsets of a WordIndex"""
+
+    def __init__(self, attempts, index: WordIndex) -> None:
+        super().__init__()
+        self.__attempts: [Word] = [Word(word, info) for word, info in to_attempt_list(attempts)]
+        self.__index: WordIndex = index
+
+    def create(self) -> int:
+        __attempt: Word
+        for __attempt in self.__attempts:
+            __attempt.process(self)
+
+        mask = self.__index.all_mask
+        position_masks = self.__index.position_masks
+        count_masks = self.__index.count_masks
+        for i in range(len(self.elements)):
+            if self.elements[i]:
+                mask &= position_masks.get((self.elements[i], i), 0)
+            else:
+                for char in self.excludes[i]:
+                    mask &= ~position_masks.get((char, i), 0)
+        for char, multiplier in self.lookaheads.items():
+            if multiplier.count:
+                mask &= count_masks.get((char, multiplier.count), 0)
+            if not multiplier.or_more:
+                mask &= ~count_masks.get((char, multiplier.count + 1), 0)
+        return mask
+
+
+class FilterEngine(ABC):
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    @property
+    def name(self):
+        return self._name
+
+    @abstractmethod
+    def filter(self, attempts) -> (List[str], str):
+        """attempts -> all matching words and a representation of the query used"""
+        pass
+
+    def narrow(self, candidates: List[str], attempt: Tuple[str, str]) -> List[str]:
+        """candidates matching all previous attempts -> candidates also matching attempt"""
+        word, info = attempt
+        if not candidates:
+            return []
+        patterns = compute_patterns(encode_words([word]), encode_words(candidates))[0]
+        return [candidates[i] for i in numpy.flatnonzero(patterns == encode_info(info))]
+
+    def __str__(self) -> str:
+        return self._name
+
+
+class RegexEngine(FilterEngine):
+
+    def __init__(self) -> None:
+        super().__init__("regex")
+
+    def filter(self, attempts) -> (List[str], str):
+        regex_builder: ColorInfoWordleRegex = ColorInfoWordleRegex(attempts)
+        with open(WORD_LIST_PATH, "r") as file:
+            all_words = file.read()
+        regex_ = regex_builder.create()
+        return execute_regex(all_words, regex_), regex_
+
+
+class PatternEngine(FilterEngine):
+
+    def __init__(self, index: WordIndex = None) -> None:
+        super().__init__("pattern")
+        self.__index = index
+
+    @property
+    def index(self) -> WordIndex:
+        return self.__index if self.__index else get_index()
+
+    def filter(self, attempts) -> (List[str], str):
+        index = self.index
+        candidates = numpy.arange(len(index))
+        query = []
+        for word, info in to_attempt_list(attempts):
+            code = encode_info(info)
+            candidates = candidates[index.pattern_row(word)[candidates] == code]
+            query.append(f"{word.lower()}:{info}")
+        return [index.words[i] for i in candidates], " ".join(query)
+
+    def narrow(self, candidates: List[str], attempt: Tuple[str, str]) -> List[str]:
+        index = self.index
+        positions = [index.position(candidate) for candidate in candidates]
+        if None in positions:
+            return super().narrow(candidates, attempt)
+        word, info = attempt
+        positions = numpy.array(positions, dtype=numpy.int64)
+        positions = positions[index.pattern_row(word)[positions] == encode_info(info)]
+        return [index.words[i] for i in positions]
+
+
+class BitmaskEngine(FilterEngine):
+
+    def __init__(self, index: WordIndex = None) -> None:
+        super().__init__("bitmask")
+        self.__index = index
+
+    @property
+    def index(self) -> WordIndex:
+        return self.__index if self.__index else get_index()
+
+    def filter(self, attempts) -> (List[str], str):
+        index = self.index
+        mask = ColorInfoWordleBitmask(attempts, index).create()
+        query = " ".join(f"{word.lower()}:{info}" for word, info in to_attempt_list(attempts))
+        return [index.words[i] for i in index.from_mask(mask)], query
+
+
+engines: Dict[str, FilterEngine] = {engine.name: engine for engine in [PatternEngine(), BitmaskEngine(), RegexEngine()]}
+DEFAULT_ENGINE = "pattern"
+
+
 class Scoring(ABC):
 
     def __init__(self, name: str) -> None:
         self._name = name
+        self.verbose: bool = True
 
     @abstractmethod
     def evaluate(self, word_list: [str]) -> [str]:
-        print(f"Using {self._name} Algorithm...")
+        if self.verbose:
+            print(f"Using {self._name} Algorithm...")
         return word_list
 
     def __str__(self) -> str:
         return self._name
 
 
+def rank_letters(statistics: Dict[str, int]) -> numpy.ndarray:
+    """letter statistics -> rank per letter code, the most frequent letter has the highest rank"""
+    ranks = numpy.zeros(len(ALPHABET), dtype=numpy.int64)
+    for i, (char, _) in enumerate(sorted(statistics.items(), key=lambda x: x[1])):
+        ranks[_letter_codes[char]] = i + 1
+    return ranks
+
+
+def compute_base_scores(words: [str], ranks: numpy.ndarray) -> numpy.ndarray:
+    """sum of letter ranks, minus 5 for every repeated character"""
+    scores = ranks[encode_words(words)].sum(axis=1)
+    return scores - 5 * numpy.array([len(word) - len(set(word)) for word in words], dtype=numpy.int64)
+
+
+def create_base_scores(statistics: Dict[str, int], word_path: str = WORD_LIST_PATH,
+                       scores_path: str = SCORES_PATH):
+    words = load_words(word_path)
+    scores = compute_base_scores(words, rank_letters(statistics))
+    # replaced atomically, running scoring contexts reload the file as soon as it changes
+    with open(scores_path + ".tmp", mode="w") as file:
+        file.write(json.dumps(dict(zip(words, scores.tolist())), indent=0, ensure_ascii=False))
+    os.replace(scores_path + ".tmp", scores_path)
+
+
+class ScoringContext:
+    """Letter ranks, whitelist and precomputed base scores, loaded once and reloaded when the files change"""
+
+    WHITELIST_BONUS = 29
+
+    @property
+    def ranks(self) -> numpy.ndarray:
+        self.refresh()
+        return self.__ranks
+
+    @property
+    def whitelist(self) -> Set[str]:
+        self.refresh()
+        return self.__whitelist
+
+    def __init__(self, statistics_path: str = STATISTICS_PATH, whitelist_path: str = WHITELIST_PATH,
+                 scores_path: str = SCORES_PATH, watch_files: bool = True) -> None:
+        self.__watch_files = watch_files
+        self.__statistics_path = statistics_path
+        self.__whitelist_path = whitelist_path
+        self.__scores_path = scores_path
+        self.__mtimes: Optional[Tuple[float, ...]] = None
+        self.__ranks: Optional[numpy.ndarray] = None
+        self.__whitelist: Set[str] = set()
+        self.__base_scores: Dict[str, int] = {}
+
+    def refresh(self):
+        """reload everything if one of the files changed since the last load"""
+        if not self.__watch_files and self.__mtimes is not None:
+            return
+        mtimes = file_mtimes([self.__statistics_path, self.__whitelist_path, self.__scores_path])
+        if mtimes == self.__mtimes:
+            return
+
+        with open(self.__statistics_path) as file:
+            self.__ranks = rank_letters(json.load(file))
+        with open(self.__whitelist_path) as file:
+            self.__whitelist = set(file.read().split())
+        self.__base_scores = {}
+        # scores are only valid if they were created from the current statistics
+        if mtimes[2] >= mtimes[0]:
+            with open(self.__scores_path) as file:
+                self.__base_scores = json.load(file)
+        self.__mtimes = mtimes
+
+    @classmethod
+    def of(cls, ranks: numpy.ndarray, whitelist: Set[str], base_scores: Dict[str, int]) -> 'ScoringContext':
+        """context with fixed content that is never reloaded from files"""
+        context = cls(watch_files=False)
+        context.__ranks = ranks
+        context.__whitelist = whitelist
+        context.__base_scores = base_scores
+        context.__mtimes = ()
+        return context
+
+    def score(self, word: str) -> int:
+        """expects an up to date context, see refresh"""
+        score = self.__base_scores.get(word)
+        if score is None:
+            score = int(compute_base_scores([word], self.__ranks)[0])
+        if word in self.__whitelist:
+            score += self.WHITELIST_BONUS
+        return score
+
+
+_scoring_context: Optional[ScoringContext] = None
+
+
+def get_scoring_context() -> ScoringContext:
+    global _scoring_context
+    if _scoring_context is None:
+        _scoring_context = ScoringContext()
+    return _scoring_context
+
+
 class SimpleScoring(Scoring):
 
-    def __init__(self) -> None:
+    def __init__(self, context: ScoringContext = None) -> None:
         super().__init__("SimpleScoring")
+        self.__context = context
 
     def evaluate(self, word_list: [str]) -> [str]:
         super().evaluate(word_list)
+        context = self.__context if self.__context else get_scoring_context()
+        context.refresh()
+        word_list.sort(reverse=True, key=context.score)
+        return word_list
 
-        def sort_word(word):
-            with open("../files/statistics.json") as file:
-                import json
-                statistics = json.load(file)
 
-            s_dict = {}
-            for i, k in enumerate(sorted(statistics.items(), key=lambda x: x[1])):
-                s_dict[k[0]] = i + 1
+class EntropyScoring(Scoring):
+    """Ranks guesses by the expected information gain of their feedback pattern over the candidates.
+    With probes enabled every word of the index is a possible guess, not only the remaining candidates."""
 
-            score = 0
-            for char in word.lower():
-                score += s_dict[char]
+    CACHE_SIZE = 32
 
-            s = set(word)
-            for _ in range(len(word) - len(s)):
-                score -= 5
+    def __init__(self, index: WordIndex = None, probes: bool = True) -> None:
+        super().__init__("EntropyScoring")
+        self.__index = index
+        self.__probes = probes
+        # rankings with probes of the recently seen candidate sets of one index, keyed by their bitset
+        self.__rankings: Tuple[Optional[WordIndex], OrderedDict] = (None, OrderedDict())
+        self.__lock = threading.Lock()
 
-            with open("../files/whitelist.txt") as file:
-                all_solution_words = file.read()
+    @property
+    def index(self) -> WordIndex:
+        return self.__index if self.__index else get_index()
 
-            if word in all_solution_words:
-                score += 29
-            return score
+    def evaluate(self, word_list: [str]) -> [str]:
+        super().evaluate(word_list)
+        if not word_list:
+            return word_list
+
+        index = self.index
+        positions = [index.position(word) for word in word_list]
+        if None in positions:
+            guesses = index.words if self.__probes else word_list
+            guess_codes = index.codes if self.__probes else encode_words(word_list)
+            candidates = {word.lower() for word in word_list}
+            is_candidate = numpy.array([guess.lower() in candidates for guess in guesses])
+            return self.__rank(guesses, pattern_entropies(compute_patterns(guess_codes, encode_words(word_list))),
+                               is_candidate)
+
+        if not self.__probes:
+            entropies = counts_entropies(count_patterns(index.patterns, rows=positions, columns=positions))
+            return self.__rank(word_list, entropies, numpy.ones(len(word_list), dtype=bool))
+
+        selection = numpy.zeros(len(index), dtype=bool)
+        selection[positions] = True
+        key = index.to_mask(selection)
+        with self.__lock:
+            if self.__rankings[0] is not index:
+                self.__rankings = (index, OrderedDict())
+            rankings = self.__rankings[1]
+            if key in rankings:
+                rankings.move_to_end(key)
+                return rankings[key].copy()
+
+        excluded = numpy.flatnonzero(~selection)
+        if len(excluded) < len(index) - len(excluded):
+            # large candidate sets: remove the few excluded words from the counts against all words
+            counts = index.pattern_counts - count_patterns(index.patterns, columns=excluded)
+        else:
+            counts = count_patterns(index.patterns, columns=numpy.flatnonzero(selection))
+        ranking = self.__rank(index.words, counts_entropies(counts), selection)
 
-        word_list.sort(reverse=True, key=sort_word)
-        return word_list
+        with self.__lock:
+            rankings[key] = ranking
+            if len(rankings) > self.CACHE_SIZE:
+                rankings.popitem(last=False)
+        return ranking.copy()
+
+    @staticmethod
+    def __rank(guesses: [str], entropies: numpy.ndarray, is_candidate: numpy.ndarray) -> [str]:
+        # highest entropy first, candidates first on ties as they might solve the game right away
+        order = numpy.lexsort((~is_candidate, -entropies.round(9)))
+        return [guesses[i] for i in order]
+
+
+class PositionalScoring(Scoring):
+    """Sum of the frequencies of every letter at its position plus the presence of every distinct letter over the
+    word list, so words with common letters at common positions come first"""
+
+    def __init__(self, index: WordIndex = None, name: str = "PositionalScoring") -> None:
+        super().__init__(name)
+        self.__index = index
+        self.__frequencies: Optional[Tuple[WordIndex, numpy.ndarray, numpy.ndarray, numpy.ndarray]] = None
+
+    @property
+    def index(self) -> WordIndex:
+        return self.__index if self.__index else get_index()
+
+    def _frequencies(self, word_list: [str],
+                     codes: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """(5, letters) positional, (letters,) presence and duplicate frequencies of the index, recounted if it was
+        replaced"""
+        index = self.index
+        if self.__frequencies is None or self.__frequencies[0] is not index:
+            self.__frequencies = (index, *letter_frequencies(index.codes))
+        return self.__frequencies[1:]
+
+    def evaluate(self, word_list: [str]) -> [str]:
+        super().evaluate(word_list)
+        if not word_list:
+            return word_list
+
+        codes = encode_words(word_list)
+        scores = self.scores(codes, *self._frequencies(word_list, codes))
+        # stable, words with equal scores keep their order
+        return [word_list[i] for i in numpy.argsort(-scores, kind="stable")]
+
+    @staticmethod
+    def scores(codes: numpy.ndarray, positional: numpy.ndarray, presence: numpy.ndarray,
+               duplicates: numpy.ndarray) -> numpy.ndarray:
+        """(n, 5) letter codes -> score per word. Repeated letters earn the presence of the letter once, and the words
+        repeating it for the second occurrence."""
+        counts = count_letters(codes)
+        return positional[numpy.arange(WORD_LENGTH), codes].sum(axis=1) + (counts > 0) @ presence + \
+            (counts > 1) @ duplicates
+
+
+class AdaptiveScoring(PositionalScoring):
+    """PositionalScoring with the frequencies of the remaining candidates instead of the whole word list.
+    The counts are kept between calls, if the candidates shrink only the removed words are subtracted."""
+
+    def __init__(self) -> None:
+        super().__init__(name="AdaptiveScoring")
+        self.__lock = threading.Lock()
+        self.__candidates: Optional[Set[str]] = None
+        self.__positional: Optional[numpy.ndarray] = None
+        self.__presence: Optional[numpy.ndarray] = None
+        self.__duplicates: Optional[numpy.ndarray] = None
+
+    def _frequencies(self, word_list: [str],
+                     codes: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """frequencies of word_list, derived from those of the previous call if word_list is a subset of it"""
+        candidates = set(word_list)
+        with self.__lock:
+            removed = self.__candidates - candidates if self.__candidates is not None else None
+            if removed is not None and candidates <= self.__candidates and len(removed) < len(candidates):
+                if removed:
+                    positional, presence, duplicates = letter_frequencies(encode_words(list(removed)))
+                    self.__positional = self.__positional - positional
+                    self.__presence = self.__presence - presence
+                    self.__duplicates = self.__duplicates - duplicates
+            else:
+                self.__positional, self.__presence, self.__duplicates = letter_frequencies(codes)
+            self.__candidates = candidates
+            return self.__positional, self.__presence, self.__duplicates
+
+
+scorings: Dict[str, Callable[[], Scoring]] = {
+    "simple": SimpleScoring, "entropy": EntropyScoring, "positional": PositionalScoring, "adaptive": AdaptiveScoring
+}
+DEFAULT_SCORING = "simple"
+
+
+class WordBundle:
+    """Word list, letter statistics, whitelist flags, base scores and optionally the pattern matrix in one binary
+    file. Layout: magic, version, length of a json header and the header within the first 4096 bytes, then every
+    section aligned to 64 bytes.
+    The header lists offset, dtype and shape of each section and a sha256 hash over all sections. Sections are
+    read straight from a read-only mmap, so opening is constant time and the pages are shared between
+    processes."""
+
+    MAGIC = b"WRDL"
+    VERSION = 1
+    ALIGNMENT = 64
+    HEADER_SIZE = 4096
+    SOURCES = [WORD_LIST_PATH, STATISTICS_PATH, WHITELIST_PATH, SCORES_PATH]
+
+    @property
+    def content_hash(self) -> str:
+        return self.__header["hash"]
+
+    @property
+    def words(self) -> List[str]:
+        """original spelling, upper case letters are restored from the case flags"""
+        if self.__words is None:
+            words = decode_words(unpack_words(self.section("packed")))
+            case = self.section("case")
+            self.__words = [
+                "".join(char.upper() if flags >> i & 1 else char for i, char in enumerate(word)) if flags else word
+                for word, flags in zip(words, case.tolist())
+            ]
+        return self.__words
+
+    @property
+    def patterns(self) -> Optional[numpy.ndarray]:
+        return self.section("patterns") if "patterns" in self.__header["sections"] else None
+
+    def __init__(self, path: str = BUNDLE_PATH) -> None:
+        with open(path, mode="rb") as file:
+            self.__buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = struct.unpack_from("<4sII", self.__buffer)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is no word bundle of version {self.VERSION}")
+        header_start = struct.calcsize("<4sII")
+        self.__header: dict = json.loads(self.__buffer[header_start:header_start + header_length])
+        self.__words: Optional[List[str]] = None
+
+    def section(self, name: str) -> numpy.ndarray:
+        section = self.__header["sections"][name]
+        count = int(numpy.prod(section["shape"]))
+        array = numpy.frombuffer(self.__buffer, dtype=section["dtype"], count=count, offset=section["offset"])
+        return array.reshape(section["shape"])
+
+    def index(self) -> WordIndex:
+        return WordIndex(self.words, self.patterns)
+
+    def scoring_context(self) -> ScoringContext:
+        words = self.words
+        whitelist = {words[i] for i in numpy.flatnonzero(self.section("whitelist"))}
+        return ScoringContext.of(self.section("ranks").copy(), whitelist,
+                                 dict(zip(words, self.section("scores").tolist())))
+
+    @classmethod
+    def is_current(cls, path: str = BUNDLE_PATH) -> bool:
+        """whether the bundle exists and is not older than the files it was created from"""
+        return os.path.exists(path) and os.path.getmtime(path) >= max(file_mtimes(cls.SOURCES))
+
+    @classmethod
+    def create(cls, path: str = BUNDLE_PATH, with_patterns: bool = True):
+        words = load_words(WORD_LIST_PATH)
+        codes = encode_words(words)
+        with open(STATISTICS_PATH) as file:
+            statistics = json.load(file)
+        whitelist = set(load_words(WHITELIST_PATH))
+
+        sections = {
+            "packed": pack_words(codes),
+            "case": numpy.array([sum(1 << i for i, char in enumerate(word) if char.isupper()) for word in words],
+                                dtype=numpy.uint8),
+            "statistics": numpy.array([statistics.get(char, 0) for char in ALPHABET], dtype=numpy.int64),
+            "ranks": rank_letters(statistics),
+            "whitelist": numpy.array([word in whitelist for word in words], dtype=numpy.uint8),
+            "scores": compute_base_scores(words, rank_letters(statistics))
+        }
+        if with_patterns:
+            patterns = numpy.load(PATTERN_MATRIX_PATH) if WordIndex.patterns_current() else None
+            sections["patterns"] = patterns if patterns is not None else compute_patterns(codes, codes)
+
+        header = {"words": len(words), "alphabet": ALPHABET, "sections": {}}
+        digest = hashlib.sha256()
+        offset = cls.HEADER_SIZE
+        for name, array in sections.items():
+            sections[name] = array = numpy.ascontiguousarray(array)
+            header["sections"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            digest.update(array.tobytes())
+            offset += -(-array.nbytes // cls.ALIGNMENT) * cls.ALIGNMENT
+        header["hash"] = digest.hexdigest()
+
+        header_bytes = json.dumps(header).encode()
+        prefix = struct.pack("<4sII", cls.MAGIC, cls.VERSION, len(header_bytes)) + header_bytes
+        if len(prefix) > cls.HEADER_SIZE:
+            raise ValueError(f"Bundle header exceeds {cls.HEADER_SIZE} bytes")
+
+        temp_path = path + ".tmp"
+        with open(temp_path, mode="wb") as file:
+            file.write(prefix)
+            for name, array in sections.items():
+                file.seek(header["sections"][name]["offset"])
+                file.write(array.tobytes())
+        os.replace(temp_path, path)
+
+
+class OpeningBook:
+    """Best second guesses per scoring, start word and feedback pattern of the start word.
+    Every entry holds the number of remaining candidates, the top scored candidates as matches, the top scored
+    words that are no candidates as probes and the best scored word of both as guess."""
+
+    SOURCES = [WORD_LIST_PATH, STATISTICS_PATH, WHITELIST_PATH]
+    SIZE = 10
+    VERSION = 2
+
+    def __init__(self, books: Dict[str, Dict[str, Dict[str, dict]]] = None) -> None:
+        self.__books: Dict[str, Dict[str, Dict[str, dict]]] = books if books else {}
+
+    def __len__(self):
+        return sum(len(book) for book in self.__books.values())
+
+    def lookup(self, scoring: Scoring, start_word: str, info: str) -> Optional[dict]:
+        """entry for the feedback info of start_word, None if the book does not cover it"""
+        return self.__books.get(str(scoring), {}).get(start_word.lower(), {}).get(info.lower())
+
+    def guess(self, scoring: Scoring, attempts: List[Tuple[str, str]]) -> Optional[str]:
+        """the second guess for the feedback on the start word. None for later attempts, feedback the book does not
+        cover or a guess that is no longer in the word list"""
+        if len(attempts) != 1:
+            return None
+        entry = self.lookup(scoring, *attempts[0])
+        if not entry or get_index().position(entry["guess"]) is None or is_discarded(entry["guess"]):
+            return None
+        return entry["guess"]
+
+    @classmethod
+    def is_current(cls, path: str = OPENING_BOOK_PATH) -> bool:
+        return os.path.exists(path) and os.path.getmtime(path) >= max(file_mtimes(cls.SOURCES))
+
+    @classmethod
+    def load(cls, path: str = OPENING_BOOK_PATH) -> 'OpeningBook':
+        """the book at path, an empty book if it is missing or older than the files it was built from"""
+        if not cls.is_current(path):
+            print(f"No up to date opening book found at {path}, run 'wt build-opening-book' to create it...")
+            return cls()
+        with open(path) as file:
+            data = json.load(file)
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            print(f"Opening book at {path} has an outdated format, run 'wt build-opening-book' to recreate it...")
+            return cls()
+        return cls(data["books"])
+
+    @classmethod
+    def create(cls, start_words: [str] = None, scorings_: [Scoring] = None, index: WordIndex = None,
+               path: str = OPENING_BOOK_PATH) -> 'OpeningBook':
+        if start_words is None:
+            with open(START_WORDS_PATH) as file:
+                start_words = [entry['word'] for entry in json.load(file)]
+        scorings_ = scorings_ if scorings_ else [scoring() for scoring in scorings.values()]
+        index = index if index else get_index()
+
+        books = {}
+        for scoring in scorings_:
+            scoring.verbose = False
+            book = books[str(scoring)] = {}
+            for start_word in start_words:
+                row = index.pattern_row(start_word)
+                book[start_word.lower()] = {}
+                for code in numpy.unique(row).tolist():
+                    candidates = [index.words[i] for i in numpy.flatnonzero(row == code)]
+                    ranking = scoring.evaluate(list(candidates))
+                    matches, probes = split_probes(ranking, candidates)
+                    book[start_word.lower()][decode_pattern(code)] = {
+                        "candidates": len(candidates),
+                        "matches": matches[:cls.SIZE],
+                        "probes": probes[:cls.SIZE],
+                        "guess": ranking[0]
+                    }
+            print(f"Created opening book for {scoring} with {len(start_words)} start words")
+
+        temp_path = path + ".tmp"
+        with open(temp_path, mode="w") as file:
+            json.dump({"version": cls.VERSION, "books": books}, file, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return cls(books)
+
+
+_opening_book: Optional[OpeningBook] = None
+
+
+def get_opening_book() -> OpeningBook:
+    global _opening_book
+    if _opening_book is None:
+        _opening_book = OpeningBook.load()
+    return _opening_book
+
+
+class Solver:
+    """Index, statistics and all precomputed tables loaded into memory up front. Answering find_words does not
+    touch the disk afterwards and is safe to share between threads."""
+
+    @property
+    def index(self) -> WordIndex:
+        return self.__index
+
+    @property
+    def engines(self) -> Dict[str, FilterEngine]:
+        return self.__engines
+
+    @property
+    def scorings(self) -> Dict[str, Scoring]:
+        return self.__scorings
+
+    @property
+    def content_hash(self) -> Optional[str]:
+        """hash of the bundle the solver was loaded from"""
+        return self.__content_hash
+
+    @property
+    def generation(self) -> int:
+        """number of the solver within the process, every reloaded solver gets a new one"""
+        return self.__generation
+
+    __generations = itertools.count()
+
+    FILES = [WORD_LIST_PATH, PATTERN_MATRIX_PATH, STATISTICS_PATH, WHITELIST_PATH, SCORES_PATH, BUNDLE_PATH,
+             OPENING_BOOK_PATH]
+
+    def __init__(self, index: WordIndex = None, context: ScoringContext = None) -> None:
+        self.__generation: int = next(Solver.__generations)
+        self.__mtimes: Tuple[float, ...] = file_mtimes(self.FILES)
+        self.__content_hash: Optional[str] = None
+        if not index and not context and WordBundle.is_current():
+            bundle = WordBundle()
+            index, context = bundle.index(), bundle.scoring_context()
+            self.__content_hash = bundle.content_hash
+        self.__index: WordIndex = index if index else WordIndex.load(use_mmap=False)
+        self.__context: ScoringContext = context if context else ScoringContext(watch_files=False)
+        self.__context.refresh()
+        self.__index.precompute()
+        self.__engines: Dict[str, FilterEngine] = {
+            engine.name: engine for engine in [PatternEngine(self.__index), BitmaskEngine(self.__index)]
+        }
+        self.__scorings: Dict[str, Scoring] = {
+            "simple": SimpleScoring(self.__context),
+            "entropy": EntropyScoring(self.__index),
+            "positional": PositionalScoring(self.__index),
+            "adaptive": AdaptiveScoring()
+        }
+        for scoring in self.__scorings.values():
+            scoring.verbose = False
+        self.__opening_book: OpeningBook = OpeningBook.load()
+
+    def files_changed(self) -> bool:
+        """whether one of the files the solver was loaded from changed since"""
+        return file_mtimes(self.FILES) != self.__mtimes
+
+    def find_words(self, attempts, engine: str = DEFAULT_ENGINE, scoring: str = DEFAULT_SCORING,
+                   limit: int = None) -> Tuple[List[str], List[str], str]:
+        """scored candidates, scored probes (words that are no candidates but narrow them down best) and the query,
+        with a limit of at most OpeningBook.SIZE words, boards with a single attempt are read from the book"""
+        attempt_list = to_attempt_list(attempts)
+        if limit and limit <= OpeningBook.SIZE and len(attempt_list) == 1:
+            word, info = attempt_list[0]
+            entry = self.__opening_book.lookup(self.__scorings[scoring], word, info)
+            if entry:
+                return entry["matches"][:limit], entry["probes"][:limit], f"{word.lower()}:{info}"
+
+        candidates, query = self.__engines[engine].filter(attempt_list)
+        matches, probes = split_probes(self.__scorings[scoring].evaluate(list(candidates)), candidates)
+        return (matches[:limit], probes[:limit], query) if limit else (matches, probes, query)
+
+
+def _rank_opener_chunk(start: int, stop: int) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """worker entry point, the index is inherited from the parent process when forked"""
+    counts = pattern_counts(get_index().patterns[start:stop])
+    expected = (counts.astype(numpy.float64) ** 2).sum(axis=1) / counts.sum(axis=1)
+    return counts_entropies(counts), expected, counts.max(axis=1)
+
+
+def rank_openers(workers: int = 1, chunk_size: int = 256) -> List[dict]:
+    """scores every word of the index as first guess against all words as answers, best entropy first"""
+    index = get_index()
+    chunks = [(start, min(start + chunk_size, len(index))) for start in range(0, len(index), chunk_size)]
+    if workers <= 1:
+        results = [_rank_opener_chunk(start, stop) for start, stop in chunks]
+    else:
+        with _process_pool(workers) as executor:
+            results = list(executor.map(_rank_opener_chunk, *zip(*chunks)))
+
+    entropies, expected, worst = (numpy.concatenate(values) for values in zip(*results))
+    order = numpy.lexsort((worst, expected, -entropies.round(9)))
+    return [
+        {
+            "word": index.words[i],
+            "entropy": float(entropies[i]),
+            "expected_remaining": float(expected[i]),
+            "worst_case": int(worst[i])
+        }
+        for i in order
+    ]
 
 
 @click.group()
@@ -351,16 +1403,17 @@ def check_solution(ctx, param, value):
 
 
 @wordle.command("solve")
+@click.option("-e", "--engine", type=click.Choice(list(engines)), default=DEFAULT_ENGINE)
+@click.option("-s", "--scoring", type=click.Choice(list(scorings)), default=DEFAULT_SCORING)
 @click.argument('attempts', nargs=-1, callback=check_solution)
-def find(attempts):
-    regex_builder: ColorInfoWordleRegex = ColorInfoWordleRegex(attempts)
-    words, regex_ = __find_words(regex_builder)
+def find(engine, scoring, attempts):
+    words, _, _ = find_words(attempts, engine, scorings[scoring]())
 
     if not words:
         print("No matches - last hope!")
         with open("../files/blacklist.txt", "r") as file:
             all_words = file.read()
-        matches = execute_regex(all_words, regex_)
+        matches = execute_regex(all_words, ColorInfoWordleRegex(attempts).create())
         click.echo(f"Found {len(matches)} words that match the passed structure...")
         scoring = SimpleScoring()
         matches = scoring.evaluate(matches)
@@ -369,30 +1422,309 @@ def find(attempts):
     return words
 
 
-def __find_words(regex_builder: WordleRegexBuilder):
-    with open("../files/5long.txt", "r") as file:
-        all_words = file.read()
-    regex_ = regex_builder.create()
-    matches = execute_regex(all_words, regex_)
-    click.echo(f"Found {len(matches)} words that match the passed structure...")
-    scoring = SimpleScoring()
-    matches = scoring.evaluate(matches)
-    click.echo(f"{matches}")
-    return matches, regex_
+def __find_words(engine: FilterEngine, attempts, scoring: Scoring, echo: bool = True):
+    matches, query = engine.filter(attempts)
+    return (*score_words(matches, scoring, echo), query)
+
+
+def score_words(matches: List[str], scoring: Scoring, echo: bool = True) -> Tuple[List[str], List[str]]:
+    """matches -> ranking of the scoring, which might contain probes, and the unscored matches"""
+    matches = _visible(matches)
+    if echo:
+        click.echo(f"Found {len(matches)} words that match the passed structure...")
+    # probes of the scoring are taken from the index, which might not be rebuilt yet
+    ranking = _visible(scoring.evaluate(list(matches)))
+    if echo:
+        click.echo(f"{ranking}")
+    return ranking, matches
 
 
 @wordle.command()
 @click.argument("regex")
 def regex(regex_):
-    with open("../files/5long.txt", "r") as file:
+    with open(WORD_LIST_PATH, "r") as file:
         all_words = file.read()
     word_list = execute_regex(all_words, regex_)
     print(word_list)
 
 
-def find_words(attempts):
-    regex_builder: WordleRegexBuilder = ColorInfoWordleRegex(attempts)
-    return __find_words(regex_builder)
+def find_words(attempts, engine: str = DEFAULT_ENGINE, scoring: Scoring = None, echo: bool = True):
+    """attempts -> ranking of the scoring, the unscored candidates and the query used"""
+    return __find_words(engines[engine], attempts, scoring if scoring else SimpleScoring(), echo)
+
+
+def match_words(attempts, engine: str = DEFAULT_ENGINE) -> Tuple[List[str], str]:
+    """attempts -> the unscored candidates and the query used, for guesses that are known without a ranking"""
+    matches, query = engines[engine].filter(attempts)
+    return _visible(matches), query
+
+
+def narrow_matches(candidates: Optional[List[str]], attempts: List[Tuple[str, str]],
+                   engine: str = DEFAULT_ENGINE) -> Tuple[List[str], Optional[str]]:
+    """candidates of the earlier attempts + the attempts since -> the unscored candidates and the last query. Without
+    known candidates the whole word list is filtered by the attempts."""
+    if candidates is None:
+        return match_words(attempts, engine)
+    words, query = candidates, None
+    for attempt in attempts:
+        words = engines[engine].narrow(words, attempt)
+        query = f"{attempt[0].lower()}:{attempt[1]}"
+    return _visible(words), query
+
+
+def narrow_words(candidates: List[str], attempt: Tuple[str, str], engine: str = DEFAULT_ENGINE,
+                 scoring: Scoring = None, echo: bool = True):
+    """candidates of the previous attempts + newest attempt -> ranking of the scoring, the unscored remaining
+    candidates and the query used. Costs are proportional to the number of candidates instead of the size of the
+    word list."""
+    matches, query = narrow_matches(candidates, [attempt], engine)
+    return (*score_words(matches, scoring if scoring else SimpleScoring(), echo), query)
+
+
+def feedback(guess: str, answer: str) -> str:
+    """t/f/c word information the game shows for guess if answer is the hidden word"""
+    return decode_pattern(compute_patterns(encode_words([guess]), encode_words([answer]))[0, 0])
+
+
+class SimulationResult:
+    STAGES = ["feedback", "book", "filter", "scoring"]
+
+    def __init__(self) -> None:
+        self.games: int = 0
+        self.lost: List[str] = []
+        self.lost_attempts: int = 0
+        self.distribution: Dict[int, int] = {attempt: 0 for attempt in range(1, 7)}
+        self.timings: Dict[str, float] = {stage: 0. for stage in self.STAGES}
+        self.duration: float = 0.
+
+    @property
+    def won(self) -> int:
+        return self.games - len(self.lost)
+
+    @property
+    def avg_attempts(self) -> Optional[float]:
+        if not self.won:
+            return None
+        return sum(attempt * count for attempt, count in self.distribution.items()) / self.won
+
+    @property
+    def all_attempts(self) -> int:
+        """attempts of won and lost games, like StartWordManager counts them"""
+        return sum(attempt * count for attempt, count in self.distribution.items()) + self.lost_attempts
+
+    def merge(self, other: 'SimulationResult'):
+        """adds the games of other, the wall clock duration is kept"""
+        self.games += other.games
+        self.lost += other.lost
+        self.lost_attempts += other.lost_attempts
+        for attempt, count in other.distribution.items():
+            self.distribution[attempt] += count
+        for stage, duration in other.timings.items():
+            self.timings[stage] += duration
+
+    def add_game(self, answer: str, won: bool, attempts: int):
+        self.games += 1
+        if won:
+            self.distribution[attempts] += 1
+        else:
+            self.lost.append(answer)
+            self.lost_attempts += attempts
+
+    def to_dict(self) -> dict:
+        return {
+            "games": self.games,
+            "won": self.won,
+            "lost": len(self.lost),
+            "avg_attempts": self.avg_attempts,
+            "distribution": self.distribution,
+            "games_per_second": self.games / self.duration if self.duration else None,
+            "timings_ms_per_game": {stage: 1000 * t / max(self.games, 1) for stage, t in self.timings.items()},
+            "lost_words": self.lost,
+            "lost_attempts": self.lost_attempts,
+            "timings": self.timings,
+            "duration": self.duration
+        }
+
+    @classmethod
+    def from_dict(cls, dict_: dict) -> 'SimulationResult':
+        result = cls()
+        result.games = dict_["games"]
+        result.lost = dict_["lost_words"]
+        result.lost_attempts = dict_["lost_attempts"]
+        result.distribution = {int(attempt): count for attempt, count in dict_["distribution"].items()}
+        result.timings = dict_["timings"]
+        result.duration = dict_["duration"]
+        return result
+
+    def echo(self):
+        click.echo(f"Played {self.games} games in {self.duration:.2f} sec "
+                   f"({self.games / self.duration if self.duration else 0:.1f} games/sec)")
+        click.echo(f"Won: {self.won}, Lost: {len(self.lost)}, Average attempts: {self.avg_attempts}")
+        for attempt, count in self.distribution.items():
+            click.echo(f"{attempt}: {count}")
+        for stage, duration in self.timings.items():
+            click.echo(f"{stage}:{' ' * (10 - len(stage))}{1000 * duration / max(self.games, 1):.3f} ms/game")
+        if self.lost:
+            click.echo(f"Lost words: {self.lost}")
+
+
+def simulate_game(answer: str, start_word: str, engine: str, scoring: Scoring, result: SimulationResult,
+                  opening_book: OpeningBook = None):
+    """plays one game like GameMaster.play_game, the feedback is computed instead of read from a GUI. The second
+    guess is taken from the opening book, later ones narrow the candidates of the previous attempt."""
+    attempts: List[Tuple[str, str]] = []
+    candidates: Optional[List[str]] = None
+    guess = start_word
+    for attempt in range(1, 7):
+        start = time.perf_counter()
+        info = feedback(guess, answer)
+        result.timings["feedback"] += time.perf_counter() - start
+        attempts.append((guess, info))
+        if info == InfoCoding.CORRECT.value * WORD_LENGTH:
+            result.add_game(answer, True, attempt)
+            return
+
+        start = time.perf_counter()
+        book_guess = opening_book.guess(scoring, attempts) if opening_book else None
+        if book_guess:
+            candidates, _ = narrow_matches(None, attempts, engine)
+            result.timings["book"] += time.perf_counter() - start
+            guess = book_guess
+            continue
+
+        words, _ = narrow_matches(candidates, attempts[-1:] if candidates is not None else attempts, engine)
+        result.timings["filter"] += time.perf_counter() - start
+        if not words:
+            break
+
+        start = time.perf_counter()
+        ranking, _ = score_words(words, scoring, echo=False)
+        candidates, _ = split_probes(ranking, words)
+        guess = ranking[0]
+        result.timings["scoring"] += time.perf_counter() - start
+    result.add_game(answer, False, len(attempts))
+
+
+def _process_pool(workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    """pool of forked workers where available. Index and statistics are loaded before forking, so workers share
+    them instead of reading the files again."""
+    get_index().precompute()
+    get_scoring_context().refresh()
+    get_opening_book()
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    return concurrent.futures.ProcessPoolExecutor(workers, mp_context=context)
+
+
+def _simulate_shard(answers: [str], start_word: str, engine: str, scoring: str) -> SimulationResult:
+    """worker entry point, index and statistics are inherited from the parent process when forked"""
+    scoring_ = scorings[scoring]()
+    scoring_.verbose = False
+    result = SimulationResult()
+    for answer in answers:
+        simulate_game(answer, start_word, engine, scoring_, result, get_opening_book())
+    return result
+
+
+def simulate(answers: [str], start_word: str = None, engine: str = DEFAULT_ENGINE,
+             scoring: str = DEFAULT_SCORING, workers: int = 1) -> SimulationResult:
+    scoring_ = scorings[scoring]()
+    scoring_.verbose = False
+    if not start_word:
+        start_word = scoring_.evaluate(list(get_index().words))[0]
+
+    start = time.perf_counter()
+    if workers <= 1:
+        result = _simulate_shard(answers, start_word, engine, scoring)
+    else:
+        result = __simulate_parallel(answers, start_word, engine, scoring, workers)
+    result.duration = time.perf_counter() - start
+    return result
+
+
+def __simulate_parallel(answers: [str], start_word: str, engine: str, scoring: str,
+                        workers: int) -> SimulationResult:
+    shard_size = max(1, len(answers) // (workers * 8))
+    shards = [answers[i:i + shard_size] for i in range(0, len(answers), shard_size)]
+    results: List[Optional[SimulationResult]] = [None] * len(shards)
+    with _process_pool(workers) as executor:
+        futures = {executor.submit(_simulate_shard, shard, start_word, engine, scoring): i
+                   for i, shard in enumerate(shards)}
+        done = 0
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+            done += len(shards[futures[future]])
+            click.echo(f"Simulated {done}/{len(answers)} games...")
+
+    # merge in shard order, so the result does not depend on scheduling
+    result = SimulationResult()
+    for shard_result in results:
+        result.merge(shard_result)
+    return result
+
+
+def evaluate_start_words(start_words: [str], answers: [str], engine: str = DEFAULT_ENGINE,
+                         scoring: str = DEFAULT_SCORING, workers: int = 1, checkpoint_path: str = None,
+                         shard_size: int = 128) -> Dict[str, SimulationResult]:
+    """plays every answer with every start word. Finished shards are saved to checkpoint_path, a run with the
+    same configuration resumes from there."""
+    config = {
+        "engine": engine,
+        "scoring": scoring,
+        "shard_size": shard_size,
+        "answers": hashlib.sha256("\n".join(answers).encode()).hexdigest()
+    }
+    checkpoint = {"config": config, "done": {}}
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as file:
+            loaded = json.load(file)
+        if loaded["config"] == config:
+            checkpoint = loaded
+            click.echo(f"Resuming from {checkpoint_path} with {len(checkpoint['done'])} finished shards...")
+        else:
+            click.echo(f"Checkpoint {checkpoint_path} belongs to another configuration, starting over...")
+
+    def save_checkpoint():
+        if checkpoint_path:
+            with open(checkpoint_path + ".tmp", mode="w") as file:
+                json.dump(checkpoint, file, ensure_ascii=False)
+            os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+    shards = {
+        f"{start_word}:{i}": (start_word, answers[i:i + shard_size])
+        for start_word in start_words for i in range(0, len(answers), shard_size)
+    }
+    pending = [key for key in shards if key not in checkpoint["done"]]
+    if pending:
+        with _process_pool(max(workers, 1)) as executor:
+            futures = {executor.submit(_simulate_shard, shards[key][1], shards[key][0], engine, scoring): key
+                       for key in pending}
+            for future in concurrent.futures.as_completed(futures):
+                checkpoint["done"][futures[future]] = future.result().to_dict()
+                save_checkpoint()
+                click.echo(f"Finished {len(checkpoint['done'])}/{len(shards)} shards...")
+
+    results = {start_word: SimulationResult() for start_word in start_words}
+    for key, (start_word, _) in shards.items():
+        results[start_word].merge(SimulationResult.from_dict(checkpoint["done"][key]))
+    return results
+
+
+@wordle.command("simulate")
+@click.option("-w", "--start-word", help="defaults to the best word of the scoring over the whole word list")
+@click.option("-a", "--answers", type=click.Choice(["wordlist", "whitelist"]), default="wordlist")
+@click.option("-e", "--engine", type=click.Choice(list(engines)), default=DEFAULT_ENGINE)
+@click.option("-s", "--scoring", type=click.Choice(list(scorings)), default=DEFAULT_SCORING)
+@click.option("-l", "--limit", type=int, help="only play the first n answers")
+@click.option("-o", "--output", type=click.Path(), help="write the result as json")
+@click.option("-p", "--workers", type=click.IntRange(1), default=1, help="number of worker processes")
+def simulate_command(start_word, answers, engine, scoring, limit, output, workers):
+    answer_words = load_words(WORD_LIST_PATH if answers == "wordlist" else WHITELIST_PATH)[:limit]
+
+    result = simulate(answer_words, start_word, engine, scoring, workers)
+    result.echo()
+    if output:
+        with open(output, mode="w") as file:
+            json.dump(result.to_dict(), file, indent=2, ensure_ascii=False)
 
 
 def execute_regex(all_words, regex_):